@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connect the feed, calendar view, user cache, membership, project version and reminder signals
+        from . import ical_feeds, calendar_window, authentication, memberships, projects, reminders  # noqa: F401
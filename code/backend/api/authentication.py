@@ -0,0 +1,227 @@
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import PersonalAccessToken
+
+User = get_user_model()
+
+# Fields needed to authenticate and authorize a request. Everything else
+# (notably the password hash) stays deferred and is loaded on first access.
+# Kept in model field order, which is what Model.from_db() expects.
+CACHED_USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {
+        'id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff',
+        'is_superuser', 'is_premium', 'invite_code', 'created', 'date_joined', 'last_login',
+        'membership_version',
+    }
+)
+# Seconds in the shared (Redis) cache. QuerySet.update() and raw SQL send
+# no signals, so this bounds how long such a change goes unnoticed unless
+# the writer calls invalidate_cached_users()
+USER_CACHE_TIMEOUT = 60
+LOCAL_CACHE_TIMEOUT = 5  # seconds, bounds how stale other processes can be
+LOCAL_CACHE_SIZE = 1024
+# How long a verified personal access token is trusted in-process; also
+# the longest a revocation can take to reach other workers
+ACCESS_TOKEN_CACHE_TIMEOUT = 30
+ACCESS_TOKEN_LAST_USED_INTERVAL = timedelta(minutes=5)
+
+
+class LocalLRUCache:
+    """Small thread-safe in-process LRU cache with a per-entry time to live"""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+_local_users = LocalLRUCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TIMEOUT)
+_verified_tokens = LocalLRUCache(LOCAL_CACHE_SIZE, ACCESS_TOKEN_CACHE_TIMEOUT)
+
+
+def user_cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    Load a user for authentication: in-process LRU first, then the shared
+    cache, then the database. Returns None if the user doesn't exist.
+
+    Saving or deleting a user evicts it from the shared cache and this
+    process's LRU, but other processes keep their copy for up to
+    LOCAL_CACHE_TIMEOUT (5s): a deactivated user can still authenticate
+    there for that long.
+    """
+    key = user_cache_key(user_id)
+    values = _local_users.get(key)
+
+    if values is None:
+        values = cache.get(key)
+        if values is None:
+            values = User.objects.filter(pk=user_id).values_list(*CACHED_USER_FIELDS).first()
+            if values is None:
+                return None
+            cache.set(key, values, USER_CACHE_TIMEOUT)
+        _local_users.set(key, values)
+
+    # A model instance with the other fields deferred, so save() only
+    # writes the cached fields and never blanks the password
+    return User.from_db(router.db_for_read(User), CACHED_USER_FIELDS, values)
+
+
+def invalidate_cached_user(user_id):
+    invalidate_cached_users([user_id])
+
+
+def invalidate_cached_users(user_ids):
+    """
+    Evict users after changes that send no signals, e.g.
+    User.objects.filter(...).update(is_active=False)
+    """
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    for key in keys:
+        _local_users.delete(key)
+    cache.delete_many(keys)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_on_change(sender, instance, **kwargs):
+    # Covers profile edits, deactivation and upgrade_to_premium
+    invalidate_cached_user(instance.pk)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user from a short-lived cache
+    instead of loading the row on every request.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Needs the password hash, which isn't cached
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
+
+
+def forget_access_token(token):
+    _verified_tokens.delete(token.key_hash)
+
+
+@receiver(post_save, sender=PersonalAccessToken)
+@receiver(post_delete, sender=PersonalAccessToken)
+def invalidate_access_token_on_change(sender, instance, **kwargs):
+    forget_access_token(instance)
+
+
+class PersonalAccessTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates "Authorization: Token <key>" requests with a personal
+    access token. Keys are looked up by their indexed prefix and checked
+    against a keyed hash, so there is no password hashing per request.
+    Tokens with the read scope can only make safe (read) requests.
+    """
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+
+        token = self.get_token(key)
+        user = get_cached_user(token.user_id)
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        if token.scope == PersonalAccessToken.SCOPE_READ and request.method not in SAFE_METHODS:
+            raise exceptions.PermissionDenied(_("This token only allows read access."))
+
+        return user, token
+
+    def get_token(self, key):
+        key_hash = PersonalAccessToken.hash_key(key)
+        token = _verified_tokens.get(key_hash)
+
+        if token is None:
+            prefix = PersonalAccessToken.split_key(key)
+            token = prefix and PersonalAccessToken.objects.filter(prefix=prefix).first()
+            if not token or not hmac.compare_digest(token.key_hash, key_hash):
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            _verified_tokens.set(key_hash, token)
+
+        if token.revoked or token.is_expired():
+            raise exceptions.AuthenticationFailed(_("Token revoked or expired."))
+
+        now = timezone.now()
+        if token.last_used is None or now - token.last_used > ACCESS_TOKEN_LAST_USED_INTERVAL:
+            token.last_used = now
+            PersonalAccessToken.objects.filter(pk=token.pk).update(last_used=now)
+
+        return token
+
+    def authenticate_header(self, request):
+        return self.keyword
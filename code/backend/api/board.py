@@ -0,0 +1,55 @@
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import RowNumber
+
+from .models import Status, Task
+
+BOARD_DEFAULT_CARDS = 20
+BOARD_MAX_CARDS = 100
+
+CARD_FIELDS = ('id', 'title', 'position', 'duration', 'deadline', 'user_id', 'dependent_on_task_id', 'event_id')
+
+
+def card_order():
+    # The manual board order, see api/fractional_index.py
+    return [F('position').asc(), F('id').asc()]
+
+
+def build_task_board(project_id, cards_per_column=BOARD_DEFAULT_CARDS):
+    """
+    Kanban board of a project: one column per status with its task count,
+    total duration and the first `cards_per_column` slim cards.
+    Counts come from one GROUP BY, cards from one windowed query.
+    """
+    tasks = Task.objects.filter(project_id=project_id)
+
+    totals = {
+        row['status_id']: row
+        for row in tasks.values('status_id').annotate(
+            count=Count('id'), duration=Sum('duration')
+        ).order_by()
+    }
+
+    cards = tasks.annotate(
+        row_number=Window(RowNumber(), partition_by=[F('status_id')], order_by=card_order())
+    ).filter(row_number__lte=cards_per_column).order_by('status_id', 'row_number').values(
+        'status_id', *CARD_FIELDS, username=F('user__username')
+    )
+
+    columns = {
+        status_id: {'status': status_id, 'name': name, 'count': 0, 'duration': 0, 'cards': []}
+        for status_id, name in Status.objects.order_by('id').values_list('id', 'name')
+    }
+    for status_id, row in totals.items():
+        column = columns.setdefault(
+            status_id, {'status': status_id, 'name': None, 'count': 0, 'duration': 0, 'cards': []}
+        )
+        column['count'] = row['count']
+        column['duration'] = row['duration'] or 0
+    for card in cards:
+        columns[card.pop('status_id')]['cards'].append(card)
+
+    return {
+        'project': project_id,
+        'columns': list(columns.values()),
+        'count': sum(column['count'] for column in columns.values()),
+    }
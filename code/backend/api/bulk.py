@@ -0,0 +1,256 @@
+import copy
+
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .memberships import get_memberships
+
+BULK_MAX = 500
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class BulkModelMixin:
+    """
+    Adds a /<prefix>/bulk/ route to a ModelViewSet:
+
+        POST   [{...}, ...]                 create
+        PATCH  [{"id": ..., ...}, ...]      partial update
+        DELETE {"ids": [...]} or [ids]      delete
+
+    Rows are validated with the viewset's serializer, access is checked once
+    for all rows through their parent (bulk_parent_field, e.g. the event of a
+    setlist entry), and each operation is a single bulk_create, bulk_update or
+    DELETE. The response has a result per row; bad rows don't stop the others.
+
+    Subclasses set bulk_parent_field. By default a parent is allowed if it
+    belongs to one of the user's organisations (bulk_parent_organisation is
+    the lookup from the parent to its organisation id); override
+    get_bulk_allowed_parents() for other rules. bulk_create and bulk_update
+    send no post_save signals, so bulk_changed() must invalidate whatever
+    the model's receivers would.
+    """
+    bulk_max = BULK_MAX
+    bulk_parent_field = None
+    bulk_parent_organisation = 'organisation_id'
+    bulk_permission_classes = [IsAuthenticated]
+
+    def get_permissions(self):
+        if self.action == 'bulk':
+            return [permission() for permission in self.bulk_permission_classes]
+        return super().get_permissions()
+
+    def get_bulk_allowed_parents(self, parent_ids):
+        """The subset of `parent_ids` the user may add, change or remove rows of"""
+        parent_model = self.get_queryset().model._meta.get_field(self.bulk_parent_field).related_model
+        return parent_model.objects.filter(
+            id__in=parent_ids,
+            **{f'{self.bulk_parent_organisation}__in': list(get_memberships(self.request))}
+        ).values_list('id', flat=True)
+
+    def bulk_prepare(self, instances):
+        """Fill in what save() or pre_save receivers would, before bulk_create"""
+
+    def bulk_changed(self, instances, previous=()):
+        """
+        Invalidate what post_save receivers would, after bulk_create/bulk_update.
+        `previous` holds copies of updated instances as they were before.
+        """
+
+    def _parent_id(self, value):
+        return getattr(value, 'pk', value)
+
+    def _allowed_parents(self, parent_ids):
+        parent_ids = {parent_id for parent_id in parent_ids if parent_id is not None}
+        if self.request.user.is_staff:
+            return parent_ids
+        return set(self.get_bulk_allowed_parents(parent_ids))
+
+    def _bulk_rows(self, request):
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('ids' if request.method == 'DELETE' else 'items')
+        if not isinstance(rows, list) or not rows or len(rows) > self.bulk_max:
+            raise ValidationError({"detail": f"Provide a list of 1 to {self.bulk_max} items."})
+        if request.method == 'DELETE' and not all(_is_id(pk) for pk in rows):
+            raise ValidationError({"detail": "ids must be a list of integers."})
+        return rows
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        rows = self._bulk_rows(request)
+        if request.method == 'POST':
+            return self.bulk_create(rows)
+        if request.method == 'PATCH':
+            return self.bulk_update(rows)
+        return self.bulk_destroy(rows)
+
+    def bulk_create(self, rows):
+        model = self.get_queryset().model
+        child = self.get_serializer(data=rows, many=True).child
+        results = [None] * len(rows)
+        valid = []  # (row index, validated data)
+
+        for index, row in enumerate(rows):
+            try:
+                valid.append((index, child.run_validation(row)))
+            except ValidationError as e:
+                results[index] = {'row': index + 1, 'errors': e.detail}
+
+        allowed = self._allowed_parents(
+            self._parent_id(data.get(self.bulk_parent_field)) for _, data in valid
+        )
+        accepted = []
+        for index, data in valid:
+            if self._parent_id(data.get(self.bulk_parent_field)) in allowed:
+                accepted.append((index, model(**data)))
+            else:
+                results[index] = {'row': index + 1, 'errors': {self.bulk_parent_field: ["Not allowed."]}}
+
+        created = []
+        if accepted:
+            instances = [instance for _, instance in accepted]
+            with transaction.atomic():
+                self.bulk_prepare(instances)
+                try:
+                    with transaction.atomic():
+                        model.objects.bulk_create(instances)
+                    created = accepted
+                except IntegrityError:
+                    # A row conflicts with an existing one or another row: insert one by one
+                    for index, instance in accepted:
+                        instance.pk = None
+                        try:
+                            with transaction.atomic():
+                                model.objects.bulk_create([instance])
+                            created.append((index, instance))
+                        except IntegrityError:
+                            results[index] = {
+                                'row': index + 1,
+                                'errors': {"non_field_errors": ["Conflicts with an existing item."]}
+                            }
+                if created:
+                    self.bulk_changed([instance for _, instance in created])
+            for index, instance in created:
+                results[index] = {'row': index + 1, 'id': instance.pk}
+
+        return Response({
+            'created': len(created),
+            'failed': len(rows) - len(created),
+            'results': results,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+    def bulk_update(self, rows):
+        model = self.get_queryset().model
+        ids = [row.get('id') if isinstance(row, dict) else None for row in rows]
+        instances = {
+            instance.pk: instance
+            for instance in self.get_queryset().filter(pk__in=[pk for pk in ids if _is_id(pk)])
+        }
+        results = [None] * len(rows)
+        changes = []  # (row index, instance, validated data)
+
+        for index, (row, pk) in enumerate(zip(rows, ids)):
+            instance = instances.get(pk) if _is_id(pk) else None
+            if instance is None:
+                results[index] = {'id': pk if _is_id(pk) else None, 'errors': {'id': ["Not found."]}}
+                continue
+            data = {key: value for key, value in row.items() if key != 'id'}
+            serializer = self.get_serializer(instance, data=data, partial=True)
+            if serializer.is_valid():
+                changes.append((index, instance, serializer.validated_data))
+            else:
+                results[index] = {'id': instance.pk, 'errors': serializer.errors}
+
+        # Both the current and a new parent must be allowed
+        field = self.bulk_parent_field
+        allowed = self._allowed_parents(
+            [getattr(instance, f'{field}_id') for _, instance, _ in changes] +
+            [self._parent_id(data[field]) for _, _, data in changes if field in data]
+        )
+
+        accepted = []  # (row index, instance, copy as it was)
+        fields = set()
+        for index, instance, data in changes:
+            current = getattr(instance, f'{field}_id')
+            new = self._parent_id(data[field]) if field in data else current
+            if current not in allowed or new not in allowed:
+                results[index] = {'id': instance.pk, 'errors': {field: ["Not allowed."]}}
+                continue
+            before = copy.copy(instance)
+            for attr, value in data.items():
+                setattr(instance, attr, value)
+                fields.add(attr)
+            accepted.append((index, instance, before))
+
+        updated = []
+        if accepted and not fields:
+            updated = accepted  # Nothing to write
+        elif accepted:
+            fields = sorted(fields)
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        model.objects.bulk_update(
+                            [instance for _, instance, _ in accepted], fields, batch_size=self.bulk_max
+                        )
+                    updated = accepted
+                except IntegrityError:
+                    # A row conflicts with an existing one or another row: update one by one
+                    for index, instance, before in accepted:
+                        try:
+                            with transaction.atomic():
+                                model.objects.bulk_update([instance], fields)
+                            updated.append((index, instance, before))
+                        except IntegrityError:
+                            results[index] = {
+                                'id': instance.pk,
+                                'errors': {"non_field_errors": ["Conflicts with an existing item."]}
+                            }
+                if updated:
+                    self.bulk_changed(
+                        [instance for _, instance, _ in updated], [before for _, _, before in updated]
+                    )
+        for index, instance, _ in updated:
+            results[index] = {'id': instance.pk}
+
+        return Response({
+            'updated': len(updated),
+            'failed': len(rows) - len(updated),
+            'results': results,
+        })
+
+    def bulk_destroy(self, ids):
+        model = self.get_queryset().model
+        instances = {instance.pk: instance for instance in self.get_queryset().filter(pk__in=ids)}
+        field = self.bulk_parent_field
+        allowed = self._allowed_parents(getattr(instance, f'{field}_id') for instance in instances.values())
+
+        results = []
+        deleted = []
+        for pk in ids:
+            instance = instances.get(pk)
+            if instance is None:
+                results.append({'id': pk, 'errors': {'id': ["Not found."]}})
+            elif getattr(instance, f'{field}_id') not in allowed:
+                results.append({'id': pk, 'errors': {field: ["Not allowed."]}})
+            else:
+                results.append({'id': pk, 'deleted': True})
+                deleted.append(instance)
+
+        if deleted:
+            # One DELETE per table; unlike the bulk writes this still sends
+            # post_delete, so bulk_changed() isn't needed
+            model.objects.filter(pk__in=[instance.pk for instance in deleted]).delete()
+
+        return Response({
+            'deleted': len(deleted),
+            'failed': len(ids) - len(deleted),
+            'results': results,
+        })
@@ -0,0 +1,48 @@
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(scope):
+    return f"version:{scope}"
+
+
+def get_version(scope):
+    """
+    Get the current version number of a cache scope (e.g. 'project:12').
+    Cached results are keyed with this version so bumping it invalidates them.
+    """
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Seed with the current time so a lost key never reuses an old version
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(scopes):
+    """{scope: version} for many scopes with one cache round trip"""
+    keys = {_version_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    return {
+        scope: found[key] if key in found else get_version(scope)
+        for key, scope in keys.items()
+    }
+
+
+def bump_version(scope):
+    """Invalidate everything cached under a scope"""
+    key = _version_key(scope)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key missing (evicted or never set)
+        version = int(time.time() * 1000)
+        cache.set(key, version, None)
+        return version
+
+
+def versioned_key(prefix, scope, *parts):
+    """Build a cache key that changes whenever the scope's version is bumped"""
+    return ":".join(str(part) for part in (prefix, get_version(scope)) + parts)
@@ -59,4 +59,94 @@ class CalendarSubscription(models.Model):
         if hasattr(settings, 'SITE_URL'):
             return f"{settings.SITE_URL}{path}"
         
-        return path  # Return relative path as fallback
\ No newline at end of file
+        return path  # Return relative path as fallback
+
+
+USER_SUBSCRIPTION_NAME = "All My Events"
+
+
+def calendar_subscription_name(organisation_name):
+    return f"{organisation_name} Calendar"
+
+
+def _create_subscriptions(subscriptions):
+    """Insert new subscriptions in one query (bulk_create skips save(), so set tokens here)"""
+    for subscription in subscriptions:
+        subscription.token = get_random_string(64)
+    CalendarSubscription.objects.bulk_create(subscriptions)
+
+
+def get_calendar_subscription_tokens(user, calendar_ids, create=True):
+    """
+    Get {calendar_id: token} of a user's subscriptions for many calendars.
+    Costs one SELECT; with `create`, missing subscriptions are added with
+    one more SELECT for their names and one bulk INSERT.
+    """
+    tokens = {}
+    subscriptions = CalendarSubscription.objects.filter(
+        user=user,
+        calendar_id__in=set(calendar_ids),
+        is_active=True
+    ).order_by('id').values_list('calendar_id', 'token')
+    for calendar_id, token in subscriptions:
+        # Keep the oldest subscription if there are several
+        tokens.setdefault(calendar_id, token)
+    
+    missing = set(calendar_ids) - set(tokens)
+    if create and missing:
+        from .models import Calendar
+        new = [
+            CalendarSubscription(user=user, calendar_id=calendar_id, name=calendar_subscription_name(name))
+            for calendar_id, name in Calendar.objects.filter(id__in=missing).values_list('id', 'organisation__name')
+        ]
+        _create_subscriptions(new)
+        tokens.update((subscription.calendar_id, subscription.token) for subscription in new)
+    
+    return tokens
+
+
+def get_user_subscription_tokens(user_ids, create=True):
+    """
+    Get {user_id: token} of the "All My Events" subscriptions of many users.
+    Costs one SELECT, plus one bulk INSERT with `create` if some are missing.
+    """
+    tokens = {}
+    subscriptions = CalendarSubscription.objects.filter(
+        user_id__in=set(user_ids),
+        calendar=None,
+        is_active=True
+    ).order_by('id').values_list('user_id', 'token')
+    for user_id, token in subscriptions:
+        tokens.setdefault(user_id, token)
+    
+    missing = [
+        CalendarSubscription(user_id=user_id, calendar=None, name=USER_SUBSCRIPTION_NAME)
+        for user_id in set(user_ids) if user_id not in tokens
+    ]
+    if create and missing:
+        _create_subscriptions(missing)
+        tokens.update((subscription.user_id, subscription.token) for subscription in missing)
+    
+    return tokens
+
+
+def calendar_feed_tokens(request, calendar_ids, create=True):
+    """Tokens of the requesting user's subscriptions to `calendar_ids`"""
+    if not request or not request.user.is_authenticated:
+        return {}
+    return get_calendar_subscription_tokens(request.user, calendar_ids, create)
+
+
+def user_feed_tokens(request, user_ids, create=True):
+    """Tokens of the "All My Events" subscriptions of `user_ids`"""
+    return get_user_subscription_tokens(user_ids, create)
+
+
+def build_feed_url(url_name, token, request=None):
+    """Absolute URL of a feed for a subscription token"""
+    url = reverse(url_name, kwargs={'token': token})
+    if request:
+        return request.build_absolute_uri(url)
+    if hasattr(settings, 'SITE_URL'):
+        return f"{settings.SITE_URL}{url}"
+    return url
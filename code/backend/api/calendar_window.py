@@ -0,0 +1,162 @@
+import hashlib
+import heapq
+
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .cache_utils import bump_version, get_versions
+from .memberships import get_memberships
+from .models import Calendar, Event, External, Project, Task, UserOrganisation
+from .utils import get_user_accessible_calendars, get_user_accessible_projects
+
+# Every row of the calendar view has this shape
+CALENDAR_VIEW_COLUMNS = ['type', 'id', 'start', 'end', 'title', 'calendar', 'project', 'is_gig']
+# Fields that decide whose calendar views a row shows up in
+CALENDAR_VIEW_TRACKED_FIELDS = {
+    Event: ('calendar_id',),
+    Task: ('project_id', 'user_id'),
+    Project: ('organisation_id',),
+}
+
+
+def build_calendar_window(user, start, end):
+    """
+    Build one time-ordered list of rows (see CALENDAR_VIEW_COLUMNS) holding
+    events, task deadlines and project deadlines visible to the user in the
+    window [start, end).
+
+    Each source is queried already sorted by its start time and the three
+    streams are combined with a k-way merge, so nothing is sorted in Python.
+    """
+    calendars = get_user_accessible_calendars(user)
+    projects = get_user_accessible_projects(user)
+
+    events = Event.objects.filter(
+        calendar__in=calendars,
+        start__lt=end,
+        end__gt=start
+    ).order_by('start', 'id').values_list(
+        'id', 'start', 'end', 'calendar__organisation__name', 'calendar_id', 'is_gig'
+    )
+
+    tasks = Task.objects.filter(
+        Q(user=user) | Q(project__in=projects),
+        deadline__gte=start,
+        deadline__lt=end
+    ).order_by('deadline', 'id').values_list('id', 'deadline', 'title', 'project_id')
+
+    project_deadlines = Project.objects.filter(
+        id__in=projects.values('id'),
+        deadline__gte=start,
+        deadline__lt=end
+    ).order_by('deadline', 'id').values_list('id', 'deadline', 'name')
+
+    event_rows = (
+        ('event', id, event_start, event_end, name, calendar_id, None, is_gig)
+        for id, event_start, event_end, name, calendar_id, is_gig in events.iterator()
+    )
+    task_rows = (
+        ('task', id, deadline, deadline, title, None, project_id, False)
+        for id, deadline, title, project_id in tasks.iterator()
+    )
+    project_rows = (
+        ('project', id, deadline, deadline, name, None, id, False)
+        for id, deadline, name in project_deadlines.iterator()
+    )
+
+    return list(heapq.merge(event_rows, task_rows, project_rows, key=lambda row: row[2]))
+
+
+def calendar_scope(kind, object_id):
+    """Cache scope of the calendar views showing an organisation's or a user's data"""
+    return f"calendar:{kind}:{object_id}"
+
+
+def calendar_view_key(request, start, end):
+    """
+    Cache key of a user's calendar view window. It's built from the versions
+    of every organisation whose events, tasks or projects the user can see,
+    so a write elsewhere leaves it alone. A change to which organisations
+    those are changes the key by itself.
+    """
+    user = request.user
+    memberships = get_memberships(request)
+    organisation_ids = set(memberships)
+    for organisation_id, calendar_organisation_id in Project.objects.filter(
+        Q(external__user=user) | Q(task__user=user)
+    ).values_list('organisation_id', 'event__calendar__organisation_id').distinct():
+        organisation_ids.add(organisation_id)
+        if calendar_organisation_id:
+            organisation_ids.add(calendar_organisation_id)
+
+    scopes = [calendar_scope('user', user.id)] + [
+        calendar_scope('organisation', organisation_id) for organisation_id in sorted(organisation_ids)
+    ]
+    versions = get_versions(scopes)
+    # Roles decide which calendars are visible, so they're part of the key too
+    state = ','.join(f"{scope}={versions[scope]}" for scope in scopes) + repr(sorted(memberships.items()))
+    digest = hashlib.sha1(state.encode()).hexdigest()
+    return ':'.join(['calendar-view', str(user.id), digest, start.isoformat(), end.isoformat()])
+
+
+def invalidate_calendar_views(organisation_ids=(), user_ids=()):
+    for organisation_id in set(organisation_ids):
+        if organisation_id:
+            bump_version(calendar_scope('organisation', organisation_id))
+    for user_id in set(user_ids):
+        if user_id:
+            bump_version(calendar_scope('user', user_id))
+
+
+# Invalidate the cached calendar views of the organisation (or user)
+# whenever something shown in them, or the access to it, changes
+
+@receiver(pre_save, sender=Event)
+@receiver(pre_save, sender=Task)
+@receiver(pre_save, sender=Project)
+def remember_calendar_view_scopes(sender, instance, **kwargs):
+    # Moved rows must also leave the calendar views of their old organisation or user
+    instance._calendar_view_previous = None
+    if instance.pk:
+        instance._calendar_view_previous = sender.objects.filter(pk=instance.pk).values(
+            *CALENDAR_VIEW_TRACKED_FIELDS[sender]
+        ).first()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_calendar_views(sender, instance, **kwargs):
+    previous = getattr(instance, '_calendar_view_previous', None) or {}
+    invalidate_calendar_views(
+        Calendar.objects.filter(
+            id__in=[instance.calendar_id, previous.get('calendar_id')]
+        ).values_list('organisation_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_calendar_views(sender, instance, **kwargs):
+    previous = getattr(instance, '_calendar_view_previous', None) or {}
+    invalidate_calendar_views(
+        Project.objects.filter(
+            id__in=[instance.project_id, previous.get('project_id')]
+        ).values_list('organisation_id', flat=True),
+        [instance.user_id, previous.get('user_id')]
+    )
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_calendar_views(sender, instance, **kwargs):
+    previous = getattr(instance, '_calendar_view_previous', None) or {}
+    invalidate_calendar_views([instance.organisation_id, previous.get('organisation_id')])
+
+
+@receiver(post_save, sender=UserOrganisation)
+@receiver(post_delete, sender=UserOrganisation)
+@receiver(post_save, sender=External)
+@receiver(post_delete, sender=External)
+def invalidate_member_calendar_views(sender, instance, **kwargs):
+    invalidate_calendar_views(user_ids=[instance.user_id])
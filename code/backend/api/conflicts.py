@@ -0,0 +1,112 @@
+import heapq
+from collections import defaultdict
+
+from .models import Event, External
+
+
+def overlapping_events(queryset, start, end):
+    """
+    Filter a queryset down to events overlapping the interval [start, end).
+    Served by the (calendar, start, end) index on Event.
+    """
+    return queryset.filter(start__lt=end, end__gt=start)
+
+
+def find_event_conflicts(event):
+    """
+    Find existing events that clash with the given (saved) event:
+    1. Another gig in the same organisation overlapping in time
+    2. An overlapping event of a project one of this event's members is part of
+
+    Returns a list of dicts, one per conflicting event.
+    """
+    conflicts = {}
+    others = Event.objects.exclude(pk=event.pk)
+
+    if event.is_gig:
+        gigs = overlapping_events(
+            others.filter(is_gig=True, calendar__organisation_id=event.calendar.organisation_id),
+            event.start, event.end
+        ).values('id', 'calendar_id', 'start', 'end', 'is_gig')
+
+        for row in gigs:
+            conflicts[row['id']] = _conflict_entry(row, 'gig')
+
+    # Members are the users added to projects that belong to this event
+    member_ids = External.objects.filter(project__event=event).values('user_id')
+    member_rows = overlapping_events(
+        others.filter(project__external__user_id__in=member_ids),
+        event.start, event.end
+    ).values('id', 'calendar_id', 'start', 'end', 'is_gig', 'project__external__user_id')
+
+    for row in member_rows:
+        entry = conflicts.get(row['id'])
+        if entry is None:
+            entry = conflicts[row['id']] = _conflict_entry(row, 'member')
+        if row['project__external__user_id'] not in entry['users']:
+            entry['users'].append(row['project__external__user_id'])
+
+    return sorted(conflicts.values(), key=lambda entry: (entry['start'], entry['event']))
+
+
+def find_organisation_conflicts(organisation_id, start, end):
+    """
+    Scan all events of an organisation in [start, end) for conflicts.
+
+    Events are swept in start order while a heap keeps the currently open
+    ones, so the scan costs O(n log n) plus the number of overlapping pairs.
+    """
+    events = list(
+        overlapping_events(
+            Event.objects.filter(calendar__organisation_id=organisation_id),
+            start, end
+        ).order_by('start', 'id').values('id', 'calendar_id', 'start', 'end', 'is_gig')
+    )
+
+    members = defaultdict(set)
+    memberships = External.objects.filter(
+        project__event_id__in=[event['id'] for event in events]
+    ).values_list('project__event_id', 'user_id')
+    for event_id, user_id in memberships:
+        members[event_id].add(user_id)
+
+    conflicts = []
+    open_events = []  # heap of (end, id, event)
+
+    for event in events:
+        while open_events and open_events[0][0] <= event['start']:
+            heapq.heappop(open_events)
+
+        for _, _, other in open_events:
+            shared_users = members[other['id']] & members[event['id']]
+
+            if other['is_gig'] and event['is_gig']:
+                conflict_type = 'gig'
+            elif shared_users:
+                conflict_type = 'member'
+            else:
+                continue
+
+            conflicts.append({
+                'type': conflict_type,
+                'events': [other['id'], event['id']],
+                'start': max(other['start'], event['start']),
+                'end': min(other['end'], event['end']),
+                'users': sorted(shared_users),
+            })
+
+        heapq.heappush(open_events, (event['end'], event['id'], event))
+
+    return conflicts
+
+
+def _conflict_entry(row, conflict_type):
+    return {
+        'type': conflict_type,
+        'event': row['id'],
+        'calendar': row['calendar_id'],
+        'start': row['start'],
+        'end': row['end'],
+        'is_gig': row['is_gig'],
+        'users': [],
+    }
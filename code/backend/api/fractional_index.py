@@ -0,0 +1,81 @@
+"""
+Fractional indexing: string sort keys that always have room for another
+key in between, so moving an item only rewrites that item's key.
+
+A key is read as the base-36 fraction 0.<key>, using the digits 0-9a-z,
+and never ends in '0'. Plain string comparison gives the same order as
+the fractions. Lowercase digits and letters sort the same way in the
+default PostgreSQL collations as they do byte by byte.
+"""
+import string
+
+DIGITS = string.digits + string.ascii_lowercase
+BASE = len(DIGITS)
+
+# Keys longer than this mean a spot was split many times; time to rebalance
+REBALANCE_KEY_LENGTH = 24
+
+
+def _midpoint(low, high):
+    """Key strictly between `low` ('' is 0) and `high` (None is 1)"""
+    if high is not None:
+        # Keep the common prefix, treating a missing digit of `low` as 0
+        prefix = 0
+        while prefix < len(high) and (low[prefix] if prefix < len(low) else '0') == high[prefix]:
+            prefix += 1
+        if prefix:
+            return high[:prefix] + _midpoint(low[prefix:], high[prefix:])
+
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+    if high is not None and len(high) > 1:
+        # e.g. between '3' and '4z': '4' is free
+        return high[0]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def key_between(before=None, after=None):
+    """
+    A key that sorts after `before` and before `after`. Either may be
+    None (or empty) for the start or end of the list.
+    """
+    before = before or ''
+    if after and before >= after:
+        raise ValueError(f"{before!r} does not sort before {after!r}")
+
+    # Appending or prepending steps the last digit instead of halving the
+    # gap, so keys grow by one digit per ~35 items instead of per ~5
+    if before and not after:
+        last = DIGITS.index(before[-1])
+        if last < BASE - 1:
+            return before[:-1] + DIGITS[last + 1]
+        return before + '1'
+    if after and not before:
+        last = DIGITS.index(after[-1])
+        if last > 1:
+            return after[:-1] + DIGITS[last - 1]
+        return after[:-1] + '0' + DIGITS[-1]
+
+    return _midpoint(before, after or None)
+
+
+def spread_keys(count):
+    """`count` ascending keys spread evenly, leaving room around each one"""
+    width = 1
+    while BASE ** width < 2 * (count + 1):
+        width += 1
+    span = BASE ** width
+
+    keys = []
+    for index in range(1, count + 1):
+        value = index * span // (count + 1)
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        keys.append(''.join(reversed(digits)).rstrip('0'))
+    return keys
+
@@ -0,0 +1,213 @@
+import glob
+import os
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from .cache_utils import get_version, bump_version
+from .calendar_token import CalendarSubscription
+from .ical_utils import generate_ical_for_calendar, generate_ical_for_user
+from .models import (
+    Calendar, Event, External, Organisation, Project, Setlist, Task, Timetable, User
+)
+
+
+def feed_scope(kind, object_id):
+    return f"ical:{kind}:{object_id}"
+
+
+def feed_filename(kind, object_id, version):
+    return os.path.join(kind, f"{object_id}-{version}.ics")
+
+
+def render_feed(kind, object_id):
+    """
+    Render a calendar or user feed to ICAL_FEED_ROOT for its current version.
+    Older versions of the same feed are removed, except the previous one,
+    which nginx may still be sending for an earlier X-Accel-Redirect.
+    Returns the path relative to ICAL_FEED_ROOT, or None if the
+    calendar/user no longer exists.
+    """
+    version = get_version(feed_scope(kind, object_id))
+
+    if kind == 'calendar':
+        calendar = Calendar.objects.select_related('organisation').filter(id=object_id).first()
+        if calendar is None:
+            return None
+        data = generate_ical_for_calendar(calendar)
+    else:
+        user = User.objects.filter(id=object_id).first()
+        if user is None:
+            return None
+        data = generate_ical_for_user(user)
+
+    filename = feed_filename(kind, object_id, version)
+    path = os.path.join(settings.ICAL_FEED_ROOT, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write to a temp file and rename so nginx never serves a partial feed
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as handle:
+        handle.write(data)
+    os.replace(tmp_path, path)
+
+    _prune_feeds(kind, object_id, version)
+    return filename
+
+
+def _prune_feeds(kind, object_id, version):
+    older = []
+    prefix = f"{object_id}-"
+    for old_path in glob.glob(os.path.join(settings.ICAL_FEED_ROOT, kind, f"{prefix}*.ics")):
+        old_version = os.path.basename(old_path)[len(prefix):-len(".ics")]
+        # Newer versions belong to a concurrent render and are left alone
+        if old_version.isdigit() and int(old_version) < version:
+            older.append((int(old_version), old_path))
+
+    for _, old_path in sorted(older)[:-1]:
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass
+
+
+def current_feed(kind, object_id):
+    """Relative path of the feed file for the current version, rendering it if missing"""
+    filename = feed_filename(kind, object_id, get_version(feed_scope(kind, object_id)))
+    if os.path.exists(os.path.join(settings.ICAL_FEED_ROOT, filename)):
+        return filename
+    return render_feed(kind, object_id)
+
+
+def feed_response(kind, object_id, download_name):
+    """
+    Serve a pre-rendered feed. Behind nginx only the X-Accel-Redirect header
+    is returned and nginx sends the file itself.
+    """
+    filename = current_feed(kind, object_id)
+    if filename is None:
+        return HttpResponse(status=404)
+
+    if settings.ICAL_FEED_X_ACCEL:
+        response = HttpResponse(content_type='text/calendar')
+        response['X-Accel-Redirect'] = f"{settings.ICAL_FEED_ACCEL_PREFIX}{filename}"
+    else:
+        with open(os.path.join(settings.ICAL_FEED_ROOT, filename), 'rb') as handle:
+            response = HttpResponse(handle.read(), content_type='text/calendar')
+
+    response['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
+
+
+def subscribed_feeds():
+    """All (kind, id) feeds that have at least one active subscription"""
+    active = CalendarSubscription.objects.filter(is_active=True)
+    calendar_ids = active.filter(calendar__isnull=False).values_list('calendar_id', flat=True).distinct()
+    user_ids = active.filter(calendar__isnull=True).values_list('user_id', flat=True).distinct()
+    return [('calendar', id) for id in calendar_ids] + [('user', id) for id in user_ids]
+
+
+def stale_feeds():
+    """Subscribed feeds whose file for the current version hasn't been written yet"""
+    return [
+        (kind, object_id) for kind, object_id in subscribed_feeds()
+        if not os.path.exists(os.path.join(
+            settings.ICAL_FEED_ROOT,
+            feed_filename(kind, object_id, get_version(feed_scope(kind, object_id)))
+        ))
+    ]
+
+
+def invalidate_feeds(calendar_ids=(), user_ids=()):
+    for calendar_id in set(calendar_ids):
+        if calendar_id:
+            bump_version(feed_scope('calendar', calendar_id))
+    for user_id in set(user_ids):
+        if user_id:
+            bump_version(feed_scope('user', user_id))
+
+
+def _event_members(event_id):
+    return External.objects.filter(project__event_id=event_id).values_list('user_id', flat=True)
+
+
+def invalidate_event_feeds_bulk(event_ids):
+    """Invalidate the feeds showing any of `event_ids`, e.g. after a bulk write of setlist entries"""
+    invalidate_feeds(
+        Event.objects.filter(id__in=event_ids).values_list('calendar_id', flat=True),
+        External.objects.filter(project__event_id__in=event_ids).values_list('user_id', flat=True)
+    )
+
+
+# Bump the version of every feed a change shows up in,
+# the renderer then writes the new files in the background
+
+@receiver(pre_delete, sender=Event)
+def remember_event_members(sender, instance, **kwargs):
+    # The projects are detached from the event once it's deleted
+    instance._feed_members = list(_event_members(instance.id))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_feeds(sender, instance, **kwargs):
+    members = getattr(instance, '_feed_members', None)
+    if members is None:
+        members = _event_members(instance.id)
+    invalidate_feeds([instance.calendar_id], members)
+
+
+@receiver(post_save, sender=Setlist)
+@receiver(post_delete, sender=Setlist)
+@receiver(post_save, sender=Timetable)
+@receiver(post_delete, sender=Timetable)
+def invalidate_event_detail_feeds(sender, instance, **kwargs):
+    calendar_id = Event.objects.filter(id=instance.event_id).values_list('calendar_id', flat=True).first()
+    invalidate_feeds([calendar_id], _event_members(instance.event_id))
+
+
+@receiver(pre_save, sender=Task)
+def remember_task_feeds(sender, instance, **kwargs):
+    # A task moved to another event or user must also leave the old feeds
+    instance._feed_previous = None
+    if instance.pk:
+        instance._feed_previous = Task.objects.filter(pk=instance.pk).values_list('event_id', 'user_id').first()
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_feeds(sender, instance, **kwargs):
+    event_ids = [instance.event_id]
+    user_ids = [instance.user_id]
+    previous = getattr(instance, '_feed_previous', None)
+    if previous:
+        event_ids.append(previous[0])
+        user_ids.append(previous[1])
+
+    calendar_ids = []
+    if any(event_ids):
+        calendar_ids = Event.objects.filter(id__in=event_ids).values_list('calendar_id', flat=True)
+    invalidate_feeds(calendar_ids, user_ids)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_feeds(sender, instance, **kwargs):
+    invalidate_feeds(
+        Calendar.objects.filter(organisation_id=instance.organisation_id).values_list('id', flat=True),
+        External.objects.filter(project_id=instance.id).values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=External)
+@receiver(post_delete, sender=External)
+def invalidate_member_feeds(sender, instance, **kwargs):
+    invalidate_feeds(user_ids=[instance.user_id])
+
+
+@receiver(post_save, sender=Organisation)
+def invalidate_organisation_feeds(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_feeds(Calendar.objects.filter(organisation=instance).values_list('id', flat=True))
@@ -0,0 +1,158 @@
+import hashlib
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from icalendar import Event as ICalEvent
+
+from .calendar_window import invalidate_calendar_views
+from .ical_feeds import invalidate_feeds
+from .models import Event, External
+
+IMPORT_CHUNK_SIZE = 500
+
+
+def iter_vevents(lines):
+    """
+    Stream VEVENT components out of an .ics file.
+
+    Only one event block is held in memory at a time, so large exports
+    from other tools can be imported without parsing the whole calendar.
+    """
+    block = None
+    for raw in lines:
+        line = raw.decode('utf-8', errors='replace') if isinstance(raw, bytes) else raw
+        line = line.rstrip('\r\n')
+        marker = line.strip().upper()
+
+        if block is None:
+            if marker == 'BEGIN:VEVENT':
+                block = [line]
+            continue
+
+        block.append(line)
+        if marker == 'END:VEVENT':
+            yield ICalEvent.from_ical('\r\n'.join(block))
+            block = None
+
+
+def _as_datetime(value):
+    """Convert an iCal date or datetime into an aware datetime"""
+    if isinstance(value, datetime):
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def _is_gig(component, summary):
+    categories = component.get('categories')
+    if categories is None:
+        categories = []
+    elif not isinstance(categories, list):
+        categories = [categories]
+
+    names = {str(name).upper() for category in categories for name in category.cats}
+    return 'GIG' in names or summary.lower().startswith('gig')
+
+
+def parse_ical_event(component):
+    """
+    Turn a VEVENT into the fields of an Event row.
+    Returns None for entries we can't place on a calendar (no start).
+    """
+    if component.get('dtstart') is None:
+        return None
+
+    raw_start = component.decoded('dtstart')
+    start = _as_datetime(raw_start)
+
+    if component.get('dtend') is not None:
+        end = _as_datetime(component.decoded('dtend'))
+    elif component.get('duration') is not None:
+        end = start + component.decoded('duration')
+    elif isinstance(raw_start, datetime):
+        end = start
+    else:
+        # All-day events without an end last one day
+        end = start + timedelta(days=1)
+
+    summary = str(component.get('summary', ''))
+    uid = str(component.get('uid', '')).strip()
+    if not uid:
+        # Fall back to a stable fingerprint so re-imports still match up
+        fingerprint = f"{start.isoformat()}|{end.isoformat()}|{summary}"
+        uid = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+    return {
+        'ical_uid': uid[:255],
+        'start': start,
+        'end': max(start, end),
+        'is_gig': _is_gig(component, summary),
+    }
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_ical(calendar, lines, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Import the events of an .ics file into a calendar.
+
+    Events are matched to existing ones by their UID and written with
+    bulk_create/bulk_update in chunks, all inside one transaction.
+
+    Returns counts of created, updated, unchanged and skipped entries.
+    """
+    stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+
+    with transaction.atomic():
+        for chunk in _chunks(iter_vevents(lines), chunk_size):
+            parsed = {}
+            for component in chunk:
+                fields = parse_ical_event(component)
+                if fields is None:
+                    stats['skipped'] += 1
+                    continue
+                # Duplicate UIDs in one file: the last entry wins
+                parsed[fields['ical_uid']] = fields
+
+            existing = {
+                event.ical_uid: event
+                for event in Event.objects.filter(calendar=calendar, ical_uid__in=list(parsed))
+            }
+
+            to_create = []
+            to_update = []
+            for uid, fields in parsed.items():
+                event = existing.get(uid)
+                if event is None:
+                    to_create.append(Event(calendar=calendar, **fields))
+                elif (event.start, event.end, event.is_gig) != (fields['start'], fields['end'], fields['is_gig']):
+                    event.start = fields['start']
+                    event.end = fields['end']
+                    event.is_gig = fields['is_gig']
+                    to_update.append(event)
+                else:
+                    stats['unchanged'] += 1
+
+            Event.objects.bulk_create(to_create, batch_size=chunk_size)
+            Event.objects.bulk_update(to_update, ['start', 'end', 'is_gig'], batch_size=chunk_size)
+            stats['created'] += len(to_create)
+            stats['updated'] += len(to_update)
+
+        if stats['created'] or stats['updated']:
+            # Bulk writes skip post_save, so invalidate cached views and feeds here
+            members = list(External.objects.filter(
+                project__event__calendar=calendar,
+                project__event__ical_uid__gt=''
+            ).values_list('user_id', flat=True))
+            transaction.on_commit(lambda: invalidate_calendar_views([calendar.organisation_id]))
+            transaction.on_commit(lambda: invalidate_feeds([calendar.id], members))
+
+    return stats
@@ -1,4 +1,3 @@
-from django.http import HttpResponse
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
@@ -10,7 +9,7 @@ from rest_framework.response import Response  # This was missing
 
 from .models import Calendar, User
 from .calendar_token import CalendarSubscription
-from .ical_utils import generate_ical_for_calendar, generate_ical_for_user
+from .ical_feeds import feed_response
 
 import logging
 logger = logging.getLogger(__name__)
@@ -25,19 +24,18 @@ def calendar_ical_feed(request, token):
     allowing users to subscribe to calendars in their calendar app.
     """
     # Find the subscription token
-    subscription = get_object_or_404(CalendarSubscription, token=token, is_active=True)
+    subscription = get_object_or_404(
+        CalendarSubscription,
+        token=token,
+        calendar__isnull=False,
+        is_active=True
+    )
     
     # Update the last_used timestamp
-    subscription.last_used = timezone.now()
-    subscription.save()
-    
-    # Generate the iCalendar data
-    ical_data = generate_ical_for_calendar(subscription.calendar, request)
+    CalendarSubscription.objects.filter(pk=subscription.pk).update(last_used=timezone.now())
     
-    # Return as .ics file
-    response = HttpResponse(ical_data, content_type='text/calendar')
-    response['Content-Disposition'] = 'attachment; filename="calendar.ics"'
-    return response
+    # The feed itself is pre-rendered and sent by nginx
+    return feed_response('calendar', subscription.calendar_id, 'calendar.ics')
 
 
 @api_view(['GET'])
@@ -58,16 +56,10 @@ def user_ical_feed(request, token):
     )
     
     # Update the last_used timestamp
-    subscription.last_used = timezone.now()
-    subscription.save()
-    
-    # Generate the iCalendar data
-    ical_data = generate_ical_for_user(subscription.user, request)
+    CalendarSubscription.objects.filter(pk=subscription.pk).update(last_used=timezone.now())
     
-    # Return as .ics file
-    response = HttpResponse(ical_data, content_type='text/calendar')
-    response['Content-Disposition'] = 'attachment; filename="events.ics"'
-    return response
+    # The feed itself is pre-rendered and sent by nginx
+    return feed_response('user', subscription.user_id, 'events.ics')
 
 
 @api_view(['GET'])
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+
+from .models import OrganisationInvitation
+
+PURGE_CHUNK_SIZE = 1000
+
+
+def with_expiry(queryset, now=None):
+    """Annotate invitations with `expired`, computed in SQL against one timestamp"""
+    now = now or timezone.now()
+    return queryset.annotate(
+        expired=ExpressionWrapper(Q(expires__lt=now), output_field=BooleanField())
+    )
+
+
+def purge_expired_invitations(grace=timedelta(0), chunk_size=PURGE_CHUNK_SIZE):
+    """
+    Delete invitations that expired more than `grace` ago without being
+    accepted, one chunk of primary keys at a time so no single statement
+    locks a large part of the table. Returns the number of deleted rows.
+    """
+    cutoff = timezone.now() - grace
+    expired = OrganisationInvitation.objects.filter(expires__lt=cutoff, accepted=False)
+    deleted = 0
+
+    while True:
+        ids = list(expired.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        OrganisationInvitation.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
@@ -0,0 +1,71 @@
+import string
+import threading
+import time
+
+from django.apps import apps
+from django.utils.crypto import get_random_string
+
+INVITE_CODE_CHARS = string.ascii_uppercase + string.digits
+INVITE_CODE_LENGTH = 8
+INVITATION_TOKEN_LENGTH = 64
+
+
+class CodeAllocator:
+    """
+    Hands out random codes that are not yet used in a unique model field.
+
+    Candidates are generated in batches and checked with one IN query per
+    batch. The free ones are kept in a small in-process pool, so creating
+    many users (or invitations) doesn't cost an exists() query per row.
+    Pooled codes are dropped after `max_age` seconds; the unique constraint
+    on the field stays the final guard against collisions.
+    """
+
+    def __init__(self, model_label, field, length, chars, batch_size=100, max_age=60):
+        self.model_label = model_label
+        self.field = field
+        self.length = length
+        self.chars = chars
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self._pool = []
+        self._validated_at = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, count):
+        model = apps.get_model(self.model_label)
+        pooled = set(self._pool)
+
+        while len(self._pool) < count:
+            wanted = max(self.batch_size, (count - len(self._pool)) * 2)
+            candidates = {get_random_string(self.length, self.chars) for _ in range(wanted)} - pooled
+
+            taken = set(model.objects.filter(
+                **{f'{self.field}__in': candidates}
+            ).values_list(self.field, flat=True))
+
+            free = candidates - taken
+            self._pool.extend(free)
+            pooled |= free
+
+        self._validated_at = time.monotonic()
+
+    def allocate(self, count=1):
+        """Return a list of `count` distinct codes that are free right now"""
+        with self._lock:
+            if time.monotonic() - self._validated_at > self.max_age:
+                self._pool = []
+            if len(self._pool) < count:
+                self._refill(count)
+
+            codes = self._pool[:count]
+            del self._pool[:count]
+            return codes
+
+
+invite_code_allocator = CodeAllocator('api.User', 'invite_code', INVITE_CODE_LENGTH, INVITE_CODE_CHARS)
+
+invitation_token_allocator = CodeAllocator(
+    'api.OrganisationInvitation', 'token', INVITATION_TOKEN_LENGTH,
+    string.ascii_letters + string.digits, batch_size=20
+)
@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api.invitations import PURGE_CHUNK_SIZE, purge_expired_invitations
+
+
+class Command(BaseCommand):
+    help = "Delete organisation invitations that expired without being accepted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-days', type=int, default=0,
+            help="Keep expired invitations for this many days before deleting them"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=PURGE_CHUNK_SIZE,
+            help="Number of invitations deleted per statement"
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and sweep every INTERVAL seconds"
+        )
+
+    def handle(self, *args, **options):
+        grace = timedelta(days=options['grace_days'])
+
+        while True:
+            deleted = purge_expired_invitations(grace, options['chunk_size'])
+            self.stdout.write(f"Deleted {deleted} expired invitations")
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,86 @@
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ical_import import import_ical
+from api.models import Calendar
+
+# <calendar_id>.ics or <calendar_id>-anything.ics
+FILENAME_PATTERN = re.compile(r'^(\d+)(?:[-_].*)?\.ics$', re.IGNORECASE)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import .ics files into calendars. Either import one file into a calendar, "
+        "or re-import every <calendar_id>.ics file dropped in a directory whenever it changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help="The .ics file to import (requires --calendar)")
+        parser.add_argument('--calendar', type=int, help="ID of the calendar to import into")
+        parser.add_argument(
+            '--watch', nargs='?', const=settings.ICAL_IMPORT_DIR, metavar='DIR',
+            help="Import all <calendar_id>.ics files in DIR (default: ICAL_IMPORT_DIR)"
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="With --watch: keep running and rescan every INTERVAL seconds"
+        )
+
+    def handle(self, *args, **options):
+        if options['watch']:
+            self.watch(options['watch'], options['interval'])
+            return
+
+        if not options['file'] or not options['calendar']:
+            raise CommandError("Pass a file and --calendar, or use --watch.")
+
+        try:
+            calendar = Calendar.objects.get(id=options['calendar'])
+        except Calendar.DoesNotExist:
+            raise CommandError(f"Calendar {options['calendar']} does not exist.")
+
+        self.import_file(calendar, options['file'])
+
+    def watch(self, directory, interval):
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory.")
+
+        seen = {}  # path -> mtime of the last import
+        while True:
+            for name in sorted(os.listdir(directory)):
+                match = FILENAME_PATTERN.match(name)
+                if not match:
+                    continue
+
+                path = os.path.join(directory, name)
+                mtime = os.path.getmtime(path)
+                if seen.get(path) == mtime:
+                    continue
+
+                calendar = Calendar.objects.filter(id=int(match.group(1))).first()
+                if calendar is None:
+                    self.stderr.write(f"Skipping {name}: calendar {match.group(1)} does not exist.")
+                else:
+                    self.import_file(calendar, path)
+                seen[path] = mtime
+
+            if not interval:
+                return
+            time.sleep(interval)
+
+    def import_file(self, calendar, path):
+        try:
+            with open(path, 'rb') as handle:
+                stats = import_ical(calendar, handle)
+        except (OSError, ValueError) as e:
+            self.stderr.write(f"Failed to import {path}: {e}")
+            return
+
+        self.stdout.write(
+            f"{path} -> calendar {calendar.id}: {stats['created']} created, "
+            f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['skipped']} skipped"
+        )
@@ -0,0 +1,51 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.provisioning import MAX_HASH_WORKERS, provision_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users from a CSV file with the columns username, password and optionally "
+        "email, first_name, last_name, organisation and role."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="CSV file with one user per row")
+        parser.add_argument('--organisation', type=int, help="Add users without an organisation column to this organisation")
+        parser.add_argument('--role', type=int, help="Role ID for --organisation")
+        parser.add_argument(
+            '--workers', type=int, default=MAX_HASH_WORKERS,
+            help=f"Password hashing processes, at most the CPU count (default: {MAX_HASH_WORKERS})"
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Users inserted per batch")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], newline='', encoding='utf-8-sig') as handle:
+                rows = [
+                    {key: value for key, value in row.items() if value not in (None, '')}
+                    for row in csv.DictReader(handle)
+                ]
+        except OSError as e:
+            raise CommandError(f"Could not read {options['file']}: {e}")
+
+        batch_size = options['batch_size']
+        created = failed = 0
+        for start in range(0, len(rows), batch_size):
+            result = provision_users(
+                rows[start:start + batch_size],
+                organisation_id=options['organisation'],
+                role_id=options['role'],
+                workers=options['workers']
+            )
+            created += result['created']
+            failed += result['failed']
+
+            for entry in result['results']:
+                if 'errors' in entry:
+                    self.stderr.write(f"Row {start + entry['row']}: {json.dumps(entry['errors'])}")
+
+        self.stdout.write(f"Created {created} users, {failed} failed")
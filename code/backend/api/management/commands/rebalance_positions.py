@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Min, Q, F
+from django.db.models.functions import Length
+
+from api.fractional_index import REBALANCE_KEY_LENGTH
+from api.models import Setlist, Task
+from api.positions import rebalance_positions
+
+# (model, parent field) pairs ordered by a fractional index
+ORDERED_LISTS = [
+    (Task, 'project'),
+    (Setlist, 'event'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite the positions of task lists and setlists whose keys got long, "
+        "are missing or collide, so later moves stay single-row updates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and check again every INTERVAL seconds"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for model, parent_field in ORDERED_LISTS:
+                parents = self.parents_to_rebalance(model, parent_field)
+                for parent_id in parents:
+                    rebalance_positions(model, parent_field, parent_id)
+                if parents:
+                    self.stdout.write(f"Rebalanced {len(parents)} {model._meta.verbose_name} lists")
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def parents_to_rebalance(self, model, parent_field):
+        return list(model.objects.values(f'{parent_field}_id').annotate(
+            longest=Max(Length('position')),
+            shortest=Min(Length('position')),
+            total=Count('id'),
+            distinct=Count('position', distinct=True),
+        ).filter(
+            Q(longest__gt=REBALANCE_KEY_LENGTH) | Q(shortest=0) | Q(total__gt=F('distinct'))
+        ).order_by().values_list(f'{parent_field}_id', flat=True))
@@ -0,0 +1,74 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.ical_feeds import render_feed, stale_feeds, subscribed_feeds
+
+
+def _render(feed):
+    kind, object_id = feed
+    try:
+        return kind, object_id, render_feed(kind, object_id), None
+    except Exception as e:
+        return kind, object_id, None, str(e)
+
+
+def _close_connections():
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-render the iCal feeds of all active subscriptions so nginx can serve them. "
+        "Without --all only feeds whose version changed are rendered."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Regenerate every subscribed feed, not just stale ones"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="Number of renderer processes (default: CPU count)"
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and look for stale feeds every INTERVAL seconds"
+        )
+
+    def handle(self, *args, **options):
+        feeds = subscribed_feeds() if options['all'] else stale_feeds()
+        self.render(feeds, options['workers'])
+
+        while options['interval']:
+            time.sleep(options['interval'])
+            self.render(stale_feeds(), options['workers'])
+
+    def render(self, feeds, workers):
+        if not feeds:
+            return
+
+        if len(feeds) == 1 or workers == 1:
+            results = map(_render, feeds)
+        else:
+            _close_connections()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_close_connections
+            ) as pool:
+                results = list(pool.map(_render, feeds, chunksize=16))
+
+        rendered = 0
+        for kind, object_id, filename, error in results:
+            if error:
+                self.stderr.write(f"Failed to render {kind} feed {object_id}: {error}")
+            elif filename:
+                rendered += 1
+
+        self.stdout.write(f"Rendered {rendered} of {len(feeds)} feeds")
@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from api.reminders import DeadlineListener, ReminderSchedule, build_reminders, deliver_reminders, reminder_sender
+
+
+class Command(BaseCommand):
+    help = (
+        "Post task and project deadline reminders to the project chats. Keeps "
+        "running; on PostgreSQL changes are picked up through LISTEN/NOTIFY, "
+        "elsewhere only by the periodic rescan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rescan', type=int, default=3600,
+            help="Reload all upcoming deadlines every RESCAN seconds"
+        )
+        parser.add_argument(
+            '--batch-window', type=int, default=5,
+            help="Also send reminders due within this many seconds, so they go out together"
+        )
+
+    def handle(self, *args, **options):
+        rescan = timedelta(seconds=options['rescan'])
+        batch_window = timedelta(seconds=options['batch_window'])
+        schedule = ReminderSchedule(horizon=rescan)
+        sender = None
+        listener = None
+        next_rescan = timezone.now()
+
+        while True:
+            try:
+                if sender is None:
+                    sender = reminder_sender()
+                if listener is None and connection.vendor == 'postgresql':
+                    listener = DeadlineListener()
+                    next_rescan = timezone.now()  # Changes may have been missed while disconnected
+
+                now = timezone.now()
+                if now >= next_rescan:
+                    schedule.load(now)
+                    next_rescan = now + rescan
+
+                due = schedule.pop_due(now + batch_window)
+                if due:
+                    sent = deliver_reminders(build_reminders(due, now), sender)
+                    self.stdout.write(f"Sent {sent} reminders")
+
+                wake_at = min(filter(None, [schedule.next_due(), next_rescan]))
+                timeout = (wake_at - timezone.now()).total_seconds()
+                if listener is None:
+                    time.sleep(max(timeout, 0))
+                    continue
+                for kind, ids in listener.wait(timeout).items():
+                    schedule.load(timezone.now(), kind, ids)
+            except OperationalError as e:
+                self.stderr.write(f"Lost the database connection, reconnecting: {e}")
+                connection.close()
+                listener = None
+                time.sleep(5)
@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_users
+from .models import Role, User, UserOrganisation
+
+# Claim names in the access token: {org id: [role id, role level]} and the
+# user's membership_version at the time the token was issued
+MEMBERSHIPS_CLAIM = 'orgs'
+MEMBERSHIP_VERSION_CLAIM = 'mv'
+
+# Users in more organisations than this get no claim and are checked against the database
+MEMBERSHIP_CLAIM_MAX_ORGS = getattr(settings, 'JWT_MEMBERSHIP_CLAIM_MAX_ORGS', 50)
+
+
+def load_memberships(user_id):
+    """{organisation id: (role id, role level)} for a user, from the database"""
+    return {
+        org_id: (role_id, level)
+        for org_id, role_id, level in UserOrganisation.objects.filter(
+            user_id=user_id
+        ).values_list('organisation_id', 'role_id', 'role__level')
+    }
+
+
+def add_membership_claims(token, user):
+    """Embed the user's memberships in a token, unless disabled or too many"""
+    if not getattr(settings, 'JWT_MEMBERSHIP_CLAIMS', True):
+        return token
+
+    memberships = load_memberships(user.id)
+    if len(memberships) <= MEMBERSHIP_CLAIM_MAX_ORGS:
+        token[MEMBERSHIPS_CLAIM] = {
+            str(org_id): [role_id, level] for org_id, (role_id, level) in memberships.items()
+        }
+        token[MEMBERSHIP_VERSION_CLAIM] = user.membership_version
+    return token
+
+
+def _memberships_from_token(request):
+    token = request.auth
+    if token is None or not hasattr(token, 'get'):
+        return None
+
+    claim = token.get(MEMBERSHIPS_CLAIM)
+    if claim is None or token.get(MEMBERSHIP_VERSION_CLAIM) != request.user.membership_version:
+        # Missing or outdated claim, the client should refresh its token
+        return None
+
+    return {int(org_id): tuple(role) for org_id, role in claim.items()}
+
+
+def get_memberships(request):
+    """
+    The requesting user's memberships. Taken from the access token while its
+    membership version is current, otherwise loaded once per request.
+    """
+    memberships = getattr(request, '_memberships', None)
+    if memberships is None:
+        memberships = _memberships_from_token(request)
+        if memberships is None:
+            memberships = load_memberships(request.user.id)
+        request._memberships = memberships
+    return memberships
+
+
+def is_member(request, organisation_id=None):
+    """Is the user in the given organisation (or in any, if none is given)"""
+    memberships = get_memberships(request)
+    if organisation_id is None:
+        return bool(memberships)
+    return int(organisation_id) in memberships
+
+
+def has_role(request, role_ids, organisation_id=None):
+    """Does the user have one of `role_ids` in the given organisation (or in any)"""
+    memberships = get_memberships(request)
+    if organisation_id is not None:
+        role = memberships.get(int(organisation_id))
+        return role is not None and role[0] in role_ids
+    return any(role_id in role_ids for role_id, _ in memberships.values())
+
+
+def bump_membership_version(user_ids):
+    User.objects.filter(pk__in=user_ids).update(membership_version=F('membership_version') + 1)
+    invalidate_cached_users(user_ids)
+
+
+@receiver(post_save, sender=UserOrganisation)
+@receiver(post_delete, sender=UserOrganisation)
+def membership_changed(sender, instance, **kwargs):
+    bump_membership_version([instance.user_id])
+
+
+@receiver(post_save, sender=Role)
+def role_changed(sender, instance, created, **kwargs):
+    # A new level changes the claims of everyone holding the role
+    if not created:
+        bump_membership_version(list(
+            UserOrganisation.objects.filter(role=instance).values_list('user_id', flat=True).distinct()
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-19 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_bugreport'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['calendar', 'start', 'end'], name='api_event_interval_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-19 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_event_interval_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='ical_uid',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(condition=models.Q(('ical_uid', ''), _negated=True), fields=('calendar', 'ical_uid'), name='api_event_unique_ical_uid'),
+        ),
+    ]
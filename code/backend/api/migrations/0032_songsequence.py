@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-19 07:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_event_ical_uid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SongSequence',
+            fields=[
+                ('organisation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='api.organisation')),
+                ('last_nr', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
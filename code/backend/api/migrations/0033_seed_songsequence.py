@@ -0,0 +1,21 @@
+from django.db import migrations
+from django.db.models import Max
+
+def seed_song_sequences(apps, schema_editor):
+    Song = apps.get_model('api', 'Song')
+    SongSequence = apps.get_model('api', 'SongSequence')
+    last_numbers = Song.objects.values('organisation_id').annotate(last_nr=Max('nr'))
+    SongSequence.objects.bulk_create([
+        SongSequence(organisation_id=row['organisation_id'], last_nr=row['last_nr'] or 0)
+        for row in last_numbers
+    ])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_songsequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_song_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-19 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_personalaccesstoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='organisationinvitation',
+            index=models.Index(condition=models.Q(('accepted', False), ('declined', False)), fields=['invite_code', 'expires'], name='api_invitation_pending_idx'),
+        ),
+    ]
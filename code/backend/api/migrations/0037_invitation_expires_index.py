@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-19 07:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_invitation_pending_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='organisationinvitation',
+            name='expires',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_COLUMNS = ['username', 'first_name', 'last_name']
+
+
+def create_indexes(apps, schema_editor):
+    # gin_trgm_ops only exists on PostgreSQL; elsewhere search scans the table
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS api_user_{column}_trgm ON api_user USING gin ({column} gin_trgm_ops);"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS api_user_{column}_trgm;")
+
+
+class Migration(migrations.Migration):
+    """
+    Trigram GIN indexes for the user autocomplete (api/people_search.py).
+    They let PostgreSQL answer ILIKE '%q%' without scanning api_user.
+    """
+
+    dependencies = [
+        ('api', '0037_invitation_expires_index'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.10 on 2026-10-19 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_user_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='setlist',
+            name='position',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='position',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='setlist',
+            index=models.Index(fields=['event', 'position'], name='api_setlist_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'position'], name='api_task_position_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from itertools import groupby
+
+from django.db import migrations
+
+from api.fractional_index import spread_keys
+
+def backfill(model, parent_field, order):
+    items = model.objects.order_by(parent_field, *order).only('pk', parent_field, 'position')
+    for _, group in groupby(items.iterator(chunk_size=2000), key=lambda item: getattr(item, parent_field)):
+        group = list(group)
+        for item, key in zip(group, spread_keys(len(group))):
+            item.position = key
+        model.objects.bulk_update(group, ['position'], batch_size=500)
+
+def backfill_positions(apps, schema_editor):
+    # Tasks keep their creation order, setlist entries their time order
+    backfill(apps.get_model('api', 'Task'), 'project_id', ['id'])
+    backfill(apps.get_model('api', 'Setlist'), 'event_id', ['time', 'id'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_task_setlist_position'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,6 @@
 # models.py
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, connection
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
@@ -15,9 +15,16 @@ from datetime import timedelta
 # So the song nr can be auto generated
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
-from .calendar_token import CalendarSubscription
+from .calendar_token import (
+    CalendarSubscription, build_feed_url, calendar_subscription_name, get_calendar_subscription_tokens,
+    get_user_subscription_tokens
+)
 from django.db.models.signals import post_save
+from .invite_codes import invite_code_allocator, invitation_token_allocator
+from .positions import append_position
 
+import hashlib
+import hmac
 import string
 import random
 
@@ -26,6 +33,8 @@ ROLE_LEVEL_TEAM = 3   # Short-term members
 ROLE_LEVEL_FAMILY_FRIENDS = 4 # Family and friends
 ROLE_LEVEL_FANS = 5       # Fans/general public
 
+DONE_STATUS_ID = 3  # Status "Done"
+
 
 
 
@@ -51,36 +60,18 @@ class User(AbstractUser):
     is_premium = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
     invite_code = models.CharField(max_length=8, unique=True, db_index=True)
+    # Bumped whenever the user's memberships change, see api/memberships.py
+    membership_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.username
 
     def get_ical_url(self, request=None):
-        # Get the iCalendar URL for all this user's events
-        # Get or create a subscription for all user's calendars
-        from .calendar_token import CalendarSubscription
-        from django.urls import reverse  # Missing import
-        
-        subscription = CalendarSubscription.objects.filter(
-            user=self, 
-            calendar=None,
-            is_active=True
-        ).first()
-        
-        if not subscription:
-            subscription = CalendarSubscription.objects.create(
-                user=self,
-                calendar=None,
-                name="All My Events"
-            )
-        
-        url = reverse('user-ical', kwargs={'token': subscription.token})
-        if request:
-            url = request.build_absolute_uri(url)
-        elif hasattr(settings, 'SITE_URL'):
-            url = f"{settings.SITE_URL}{url}"
-        
-        return url
+        """URL of this user's "All My Events" feed, or "" if they have no subscription yet"""
+        token = get_user_subscription_tokens([self.id], create=False).get(self.id)
+        if not token:
+            return ""
+        return build_feed_url('user-ical', token, request)
     
     def save(self, *args, **kwargs):
         if not self.invite_code:
@@ -90,11 +81,7 @@ class User(AbstractUser):
     @classmethod
     def generate_unique_invite_code(cls):
         """Generate a unique 8-character alphanumeric code"""
-        chars = string.ascii_uppercase + string.digits
-        while True:
-            code = ''.join(random.choices(chars, k=8))
-            if not cls.objects.filter(invite_code=code).exists():
-                return code
+        return invite_code_allocator.allocate()[0]
     
     # Add related_name arguments to avoid clashes with auth.User
     groups = models.ManyToManyField(
@@ -113,35 +100,6 @@ class User(AbstractUser):
     )
     is_premium = models.BooleanField(default=False)
 
-    def __str__(self):
-        return self.username
-
-    def get_ical_url(self, request=None):
-        # Get the iCalendar URL for all this user's events
-        # Get or create a subscription for all user's calendars
-        from .calendar_token import CalendarSubscription
-        
-        subscription = CalendarSubscription.objects.filter(
-            user=self, 
-            calendar=None,
-            is_active=True
-        ).first()
-        
-        if not subscription:
-            subscription = CalendarSubscription.objects.create(
-                user=self,
-                calendar=None,
-                name="All My Events"
-            )
-        
-        url = reverse('user-ical', kwargs={'token': subscription.token})
-        if request:
-            url = request.build_absolute_uri(url)
-        elif hasattr(settings, 'SITE_URL'):
-            url = f"{settings.SITE_URL}{url}"
-        
-        return url
-
 #not for every user
 class Organisation(models.Model):
     name = models.CharField(max_length=255)
@@ -184,38 +142,37 @@ class Calendar(models.Model):
     def __str__(self):
         return f"Calendar for {self.organisation}"
     
-    # Add the get_ical_url method here
     def get_ical_url(self, request=None):
-        """Get the public iCalendar URL for this calendar"""
-        try:
-            # Generate a subscription token if none exists
-            subscription = self.get_or_create_subscription()
-            
-            if not subscription:
-                # Return an empty string or None if no subscription could be created
-                return ""
-            
-            url = reverse('calendar-ical', kwargs={'token': subscription.token})
-            if request:
-                url = request.build_absolute_uri(url)
-            elif hasattr(settings, 'SITE_URL'):
-                url = f"{settings.SITE_URL}{url}"
-            
-            return url
-        except Exception as e:
-            # For debugging, log the error
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error generating iCal URL: {str(e)}")
-            
-            # Return an empty string to avoid breaking the API response
+        """URL of the requesting user's feed of this calendar, or "" if they have no subscription yet"""
+        user = getattr(request, 'user', None) or self.user
+        if user is None or not user.is_authenticated:
             return ""
+        token = get_calendar_subscription_tokens(user, [self.id], create=False).get(self.id)
+        if not token:
+            return ""
+        return build_feed_url('calendar-ical', token, request)
     
     # You also need to add the get_or_create_subscription method here
     def get_or_create_subscription(self, user=None):
         """Get or create a subscription token for this calendar"""
-        # The implementation of this method goes here
-        # This would be the improved version I provided earlier
+        user = user or self.user
+        if user is None or not user.is_authenticated:
+            return None
+        
+        subscription = CalendarSubscription.objects.filter(
+            user=user,
+            calendar=self,
+            is_active=True
+        ).order_by('id').first()
+        
+        if not subscription:
+            subscription = CalendarSubscription.objects.create(
+                user=user,
+                calendar=self,
+                name=calendar_subscription_name(self.organisation.name)
+            )
+        
+        return subscription
 
 # Only access (CRUD) on calender you have access to
 class Event(models.Model):
@@ -223,6 +180,20 @@ class Event(models.Model):
     start = models.DateTimeField()
     end = models.DateTimeField()
     is_gig = models.BooleanField(default=False)
+    ical_uid = models.CharField(max_length=255, blank=True, default='')  # UID of imported iCal events
+    
+    class Meta:
+        # Interval index used by the conflict checks (see conflicts.py)
+        indexes = [
+            models.Index(fields=['calendar', 'start', 'end'], name='api_event_interval_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['calendar', 'ical_uid'],
+                condition=~models.Q(ical_uid=''),
+                name='api_event_unique_ical_uid'
+            ),
+        ]
     
     def __str__(self):
         return f"Event on {self.start.strftime('%H:%M')} - {self.end.strftime('%H:%M')}"
@@ -308,15 +279,15 @@ class Project(models.Model):
 
 @receiver(post_save, sender=Project)
 def create_project_chat(sender, instance, created, **kwargs):
-    print(f"Signal triggered: created={created}, has_chat={hasattr(instance, 'chat')}")
-    if created and not instance.chat:  # Changed this line
+    # Safety net for projects not created through api.projects (e.g. the admin)
+    if created and not instance.chat_id:
         chat = Chat.objects.create(
-            organisation=instance.organisation,
+            organisation_id=instance.organisation_id,
             name=f"Project Chat: {instance.name}",
             min_role_level=ROLE_LEVEL_TEAM
         )
+        Project.objects.filter(pk=instance.pk).update(chat=chat)
         instance.chat = chat
-        instance.save()
 
 
 # Only can see all your chats by user_id or all chats your added to
@@ -359,18 +330,45 @@ class Song(models.Model):
     def __str__(self):
         return self.name
 
+# Hands out song numbers per organisation
+class SongSequence(models.Model):
+    organisation = models.OneToOneField(Organisation, on_delete=models.CASCADE, primary_key=True)
+    last_nr = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"Song numbers of {self.organisation} (last: {self.last_nr})"
+    
+    @classmethod
+    def reserve(cls, organisation_id, count=1):
+        """
+        Reserve `count` consecutive song numbers for an organisation and
+        return the first one. The counter is advanced with a single
+        UPDATE ... RETURNING, so concurrent callers never get the same numbers.
+        """
+        sql = (
+            f"UPDATE {cls._meta.db_table} SET last_nr = last_nr + %s "
+            f"WHERE organisation_id = %s RETURNING last_nr"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [count, organisation_id])
+            row = cursor.fetchone()
+        
+        if row is None:
+            # No counter yet: start it from the songs that already exist
+            max_nr = Song.objects.filter(organisation_id=organisation_id).aggregate(
+                models.Max('nr')
+            )['nr__max']
+            cls.objects.get_or_create(organisation_id=organisation_id, defaults={'last_nr': max_nr or 0})
+            return cls.reserve(organisation_id, count)
+        
+        return row[0] - count + 1
+
 # So we can update song number automatcily
 @receiver(pre_save, sender=Song)
 def set_song_number(sender, instance, **kwargs):
     # Only set nr if this is a new song (doesn't have an ID yet)
-    if not instance.pk:
-        # Find the highest nr for songs in this organization
-        max_nr = Song.objects.filter(organisation=instance.organisation).aggregate(
-            models.Max('nr')
-        )['nr__max']
-        
-        # If no songs exist yet for this org, start at 1, otherwise increment
-        instance.nr = 1 if max_nr is None else max_nr + 1
+    if not instance.pk and not instance.nr:
+        instance.nr = SongSequence.reserve(instance.organisation_id)
 
 # Only access (CRUD) on projectes your are added to
 class Timetable(models.Model):
@@ -387,6 +385,18 @@ class Setlist(models.Model):
     time = models.TimeField()
     name = models.CharField(max_length=255)
     song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    # Fractional index within the event, see api/fractional_index.py
+    position = models.CharField(max_length=255, blank=True, default='')
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'position'], name='api_setlist_position_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self.position:
+            self.position = append_position(Setlist, 'event', self.event_id)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.name} - {self.song} at {self.time.strftime('%H:%M')}"
@@ -413,6 +423,18 @@ class Task(models.Model):
     deadline = models.DateTimeField(null=True, blank=True)
     dependent_on_task = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True)
     event = models.ForeignKey(Event, on_delete=models.SET_NULL, null=True, blank=True)
+    # Fractional index within the project, see api/fractional_index.py
+    position = models.CharField(max_length=255, blank=True, default='')
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'position'], name='api_task_position_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self.position:
+            self.position = append_position(Task, 'project', self.project_id)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.title
@@ -462,16 +484,24 @@ class OrganisationInvitation(models.Model):
     role = models.ForeignKey(Role, on_delete=models.CASCADE)
     token = models.CharField(max_length=64, unique=True, db_index=True)
     created = models.DateTimeField(auto_now_add=True)
-    expires = models.DateTimeField()
+    expires = models.DateTimeField(db_index=True)
     accepted = models.BooleanField(default=False)
     declined = models.BooleanField(default=False)
     
     class Meta:
         unique_together = ('organisation', 'invite_code')  # Changed from 'invited_user'
+        indexes = [
+            # Pending invitations of a user (see my_invitations)
+            models.Index(
+                fields=['invite_code', 'expires'],
+                name='api_invitation_pending_idx',
+                condition=models.Q(accepted=False, declined=False),
+            ),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.token:
-            self.token = get_random_string(64)
+            self.token = invitation_token_allocator.allocate()[0]
         if not self.expires:
             self.expires = timezone.now() + timedelta(days=7)
         super().save(*args, **kwargs)
@@ -496,4 +526,68 @@ class BugReport(models.Model):
         return f"Bug #{self.id}: {self.title}"
     
     class Meta:
-        ordering = ['-created']
\ No newline at end of file
+        ordering = ['-created']
+
+
+class PersonalAccessToken(models.Model):
+    """
+    Long-lived API token for scripts and integrations, sent as
+    "Authorization: Token <key>". Only an HMAC of the key is stored;
+    the prefix identifies the row without revealing the secret.
+    """
+    SCOPE_READ = 'read'
+    SCOPE_WRITE = 'write'
+    SCOPE_CHOICES = [
+        (SCOPE_READ, 'Read only'),
+        (SCOPE_WRITE, 'Read and write'),
+    ]
+    KEY_PREFIX = 'dlg'
+    PREFIX_LENGTH = 8
+    SECRET_LENGTH = 40
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='access_tokens')
+    name = models.CharField(max_length=100)
+    prefix = models.CharField(max_length=PREFIX_LENGTH, unique=True, db_index=True)
+    key_hash = models.CharField(max_length=64)
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, default=SCOPE_READ)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(null=True, blank=True)
+    last_used = models.DateTimeField(null=True, blank=True)
+    revoked = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.name} ({self.prefix}...)"
+
+    class Meta:
+        ordering = ['-created']
+
+    @staticmethod
+    def hash_key(key):
+        # A keyed SHA-256 is enough for random keys and takes microseconds,
+        # unlike the deliberately slow password hashers
+        return hmac.new(settings.SECRET_KEY.encode(), key.encode(), hashlib.sha256).hexdigest()
+
+    @classmethod
+    def split_key(cls, key):
+        """Return the prefix of a key in the form dlg_<prefix>_<secret>, or None"""
+        parts = key.split('_')
+        if len(parts) != 3 or parts[0] != cls.KEY_PREFIX or len(parts[1]) != cls.PREFIX_LENGTH:
+            return None
+        return parts[1]
+
+    @classmethod
+    def create_token(cls, user, name, scope=SCOPE_READ, expires=None):
+        """Create a token and return (instance, key). The key is only available here."""
+        while True:
+            prefix = get_random_string(cls.PREFIX_LENGTH)
+            if not cls.objects.filter(prefix=prefix).exists():
+                break
+        key = f"{cls.KEY_PREFIX}_{prefix}_{get_random_string(cls.SECRET_LENGTH)}"
+        token = cls.objects.create(
+            user=user, name=name, prefix=prefix, key_hash=cls.hash_key(key),
+            scope=scope, expires=expires
+        )
+        return token, key
+
+    def is_expired(self):
+        return self.expires is not None and self.expires <= timezone.now()
@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .memberships import get_memberships
+from .models import External, UserOrganisation
+
+User = get_user_model()
+
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 25
+# Upper bound for one lookup on PostgreSQL; a slow keystroke is dropped, not queued
+AUTOCOMPLETE_STATEMENT_TIMEOUT_MS = 250
+# Rows ranked in Python on databases without pg_trgm
+FALLBACK_CANDIDATES = 200
+
+SEARCH_FIELDS = ('username', 'first_name', 'last_name')
+RESULT_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+
+def visible_users(request, organisation_id=None):
+    """
+    Users the requesting user may look up: members of their organisations
+    and externals on projects of those organisations or on their own projects.
+    """
+    user = request.user
+    if user.is_staff and organisation_id is None:
+        return User.objects.all()
+
+    if organisation_id is not None:
+        org_ids = [organisation_id]
+        if not user.is_staff and organisation_id not in get_memberships(request):
+            return User.objects.none()
+    else:
+        org_ids = list(get_memberships(request))
+
+    members = UserOrganisation.objects.filter(organisation_id__in=org_ids).values('user_id')
+    project_filter = Q(project__organisation_id__in=org_ids)
+    if organisation_id is None:
+        project_filter |= Q(project__external__user=user)
+    externals = External.objects.filter(project_filter).values('user_id')
+
+    return User.objects.filter(Q(id__in=members) | Q(id__in=externals))
+
+
+def _matches(query):
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__icontains': query})
+    return condition
+
+
+def _search_postgresql(queryset, query, limit):
+    # Imported here so SQLite setups don't need the PostgreSQL extras
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    # icontains becomes ILIKE, which the gin_trgm_ops indexes serve
+    queryset = queryset.filter(_matches(query)).annotate(
+        prefix=Case(
+            When(username__istartswith=query, then=Value(0)),
+            *[When(**{f'{field}__istartswith': query}, then=Value(1)) for field in SEARCH_FIELDS[1:]],
+            default=Value(2),
+            output_field=IntegerField()
+        ),
+        similarity=Greatest(*[TrigramSimilarity(field, query) for field in SEARCH_FIELDS]),
+    ).order_by('prefix', '-similarity', 'username').values(*RESULT_FIELDS)[:limit]
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL statement_timeout = {AUTOCOMPLETE_STATEMENT_TIMEOUT_MS}")
+        return list(queryset)
+
+
+def _rank(row, query):
+    # Same order as on PostgreSQL: username prefix, name prefix, then
+    # earlier matches and shorter usernames
+    positions = [row[field].lower().find(query) for field in SEARCH_FIELDS]
+    if positions[0] == 0:
+        prefix = 0
+    elif 0 in positions:
+        prefix = 1
+    else:
+        prefix = 2
+    first = min((position for position in positions if position >= 0), default=0)
+    return (prefix, first, len(row['username']), row['username'])
+
+
+def _search_fallback(queryset, query, limit):
+    candidates = list(queryset.filter(_matches(query)).values(*RESULT_FIELDS)[:FALLBACK_CANDIDATES])
+    lowered = query.lower()
+    candidates.sort(key=lambda row: _rank(row, lowered))
+    return candidates[:limit]
+
+
+def search_people(request, query, limit=AUTOCOMPLETE_DEFAULT_LIMIT, organisation_id=None):
+    """
+    Ranked lookup of visible users by username or name for autocomplete.
+    Returns a list of {id, username, first_name, last_name} dicts.
+    """
+    query = query.strip()
+    if len(query) < AUTOCOMPLETE_MIN_LENGTH:
+        return []
+
+    limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+    queryset = visible_users(request, organisation_id)
+
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(queryset, query, limit)
+    return _search_fallback(queryset, query, limit)
@@ -2,6 +2,7 @@ from rest_framework.permissions import BasePermission, SAFE_METHODS
 from rest_framework.exceptions import PermissionDenied
 from rest_framework import permissions
 
+from .memberships import has_role, is_member
 from .models import Calendar, Event, External, UserOrganisation, Project
 from .utils import (
     get_user_accessible_calendars,
@@ -59,6 +60,9 @@ class CanAccessCalendar(BasePermission):
         
         return True
 
+# Role IDs allowed to manage songs (1=Admin, 2=Core Team)
+SONG_MANAGER_ROLE_IDS = [1, 2]
+
 class HasSongPermission(BasePermission):
     """
     Permission to check if user has the right role in an organization to access songs.
@@ -70,23 +74,13 @@ class HasSongPermission(BasePermission):
         if user.is_staff:
             return True
         
-        # Define which role IDs have permission to manage songs
-        # Adjust these IDs based on your actual Role model data
-        SONG_MANAGER_ROLE_IDS = [1, 2]  # Example: 1=Admin, 2=Music Director
-        
-        # Check if user has any of the required roles in any organization
-        has_role = UserOrganisation.objects.filter(
-            user=user,
-            role_id__in=SONG_MANAGER_ROLE_IDS
-        ).exists()
-        
         # For safe methods like GET, allow access if the user belongs to any organization
         if request.method in permissions.SAFE_METHODS:
-            is_in_org = UserOrganisation.objects.filter(user=user).exists()
-            return has_role or is_in_org
+            return is_member(request)
         
         # For unsafe methods (POST, PUT, DELETE), require specific roles
-        return has_role
+        # in any organization
+        return has_role(request, SONG_MANAGER_ROLE_IDS)
 
 class IsMessageOwnerOrReadOnly(BasePermission):
     """
@@ -107,7 +101,7 @@ class IsPartOfOrganisation(BasePermission):
     """
     def has_permission(self, request, view):
         user = request.user
-        return user.is_staff or UserOrganisation.objects.filter(user=user).exists()
+        return user.is_staff or is_member(request)
 
 class IsPartOfOrganisationAndStaff(BasePermission):
     """
@@ -118,10 +112,7 @@ class IsPartOfOrganisationAndStaff(BasePermission):
 
     def has_permission(self, request, view):
         user = request.user
-        return user.is_staff or UserOrganisation.objects.filter(
-            user=user,
-            role_id__in=self.STAFF_ROLE_IDS
-        ).exists()
+        return user.is_staff or has_role(request, self.STAFF_ROLE_IDS)
 
     """
     Permission to check if a user can create an organisation.
@@ -141,6 +132,10 @@ class IsProjectMember(BasePermission):
         if request.method in SAFE_METHODS:
             return True
             
+        # Actions on an existing object (e.g. move) are checked in has_object_permission
+        if view.detail:
+            return True
+            
         # For POST/create operations, check project access
         if request.method == 'POST':
             user = request.user
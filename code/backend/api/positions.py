@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Max, Q
+
+from .fractional_index import REBALANCE_KEY_LENGTH, key_between, spread_keys
+
+
+def _siblings(model, parent_field, parent_id):
+    return model.objects.filter(**{f'{parent_field}_id': parent_id})
+
+
+def append_position(model, parent_field, parent_id):
+    """Position after the last item of a parent (served by the (parent, position) index)"""
+    siblings = _siblings(model, parent_field, parent_id)
+    position = key_between(siblings.aggregate(last=Max('position'))['last'], None)
+    if len(position) > REBALANCE_KEY_LENGTH:
+        rebalance_positions(model, parent_field, parent_id)
+        position = key_between(siblings.aggregate(last=Max('position'))['last'], None)
+    return position
+
+
+def append_positions(model, parent_field, items):
+    """Give unsaved items without a position consecutive positions at the end of their parent"""
+    by_parent = {}
+    for item in items:
+        if not item.position:
+            by_parent.setdefault(getattr(item, f'{parent_field}_id'), []).append(item)
+
+    for parent_id, group in by_parent.items():
+        position = _siblings(model, parent_field, parent_id).aggregate(last=Max('position'))['last']
+        for item in group:
+            position = key_between(position, None)
+            item.position = position
+
+
+def rebalance_positions(model, parent_field, parent_id):
+    """Give all items of a parent short, evenly spread positions in their current order"""
+    with transaction.atomic():
+        items = list(_siblings(model, parent_field, parent_id).select_for_update().order_by(
+            'position', 'pk'
+        ).only('pk', 'position'))
+        for item, key in zip(items, spread_keys(len(items))):
+            item.position = key
+        model.objects.bulk_update(items, ['position'], batch_size=500)
+    return len(items)
+
+
+def _neighbour_position(siblings, pk):
+    position = siblings.filter(pk=pk).values_list('position', flat=True).first()
+    if position is None:
+        raise ValueError(f"Item {pk} is not in the same list.")
+    return position
+
+
+def _bounds(siblings, after_id, before_id):
+    lower = _neighbour_position(siblings, after_id) if after_id else None
+    upper = _neighbour_position(siblings, before_id) if before_id else None
+
+    if after_id and not before_id:
+        upper = siblings.filter(
+            Q(position__gt=lower) | Q(position=lower, pk__gt=after_id)
+        ).order_by('position', 'pk').values_list('position', flat=True).first()
+    elif before_id and not after_id:
+        lower = siblings.filter(
+            Q(position__lt=upper) | Q(position=upper, pk__lt=before_id)
+        ).order_by('-position', '-pk').values_list('position', flat=True).first()
+    elif not after_id and not before_id:
+        lower = siblings.aggregate(last=Max('position'))['last']
+
+    return lower, upper
+
+
+def move_item(item, parent_field, after_id=None, before_id=None, update_fields=()):
+    """
+    Move `item` between the items `after_id` and `before_id` of its parent
+    (either may be None; with neither it goes to the end). Only the moved row
+    is written, unless the keys around it ran out of room, in which case the
+    parent's positions are rebalanced first.
+    """
+    model = type(item)
+    parent_id = getattr(item, f'{parent_field}_id')
+    siblings = _siblings(model, parent_field, parent_id).exclude(pk=item.pk)
+
+    for attempt in range(2):
+        lower, upper = _bounds(siblings, after_id, before_id)
+        try:
+            position = key_between(lower, upper)
+            if len(position) <= REBALANCE_KEY_LENGTH or attempt:
+                break
+        except ValueError:
+            # Duplicate or out of order keys, e.g. from concurrent inserts
+            if attempt:
+                raise
+        rebalance_positions(model, parent_field, parent_id)
+
+    item.position = position
+    item.save(update_fields=['position', *update_fields])
+    return item
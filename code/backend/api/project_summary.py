@@ -0,0 +1,105 @@
+from django.db.models import Count, F, IntegerField, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DONE_STATUS_ID, External, Message, Project, Status, Task
+
+PROJECT_FIELDS = ('id', 'name', 'status_id', 'event_id', 'deadline', 'priority', 'organisation_id', 'chat_id')
+
+
+def _count(queryset, group_by):
+    # COUNT(*) of a correlated subquery, grouped by its link to the outer row
+    return Coalesce(Subquery(
+        queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total')[:1],
+        output_field=IntegerField()
+    ), 0)
+
+
+def build_project_summary(project_id, now=None):
+    """
+    What the project screen shows above the fold, without the nested tasks
+    of ProjectDetailSerializer: the project fields, task counts by status,
+    the next open deadline, the member count and the last chat message.
+    One query for the project row, one GROUP BY for the task counts and
+    one for the status names. Returns None if the project doesn't exist.
+    """
+    now = now or timezone.now()
+    open_tasks = Task.objects.filter(project_id=OuterRef('pk')).exclude(status_id=DONE_STATUS_ID)
+    next_task = open_tasks.filter(deadline__gte=now).order_by('deadline', 'id')
+
+    project = Project.objects.filter(id=project_id).annotate(
+        event_start=F('event__start'),
+        next_task_id=Subquery(next_task.values('id')[:1]),
+        next_task_title=Subquery(next_task.values('title')[:1]),
+        next_task_deadline=Subquery(next_task.values('deadline')[:1]),
+        overdue=_count(open_tasks.filter(deadline__lt=now), 'project_id'),
+        members=_count(External.objects.filter(project_id=OuterRef('pk')), 'project_id'),
+        last_message_at=Subquery(
+            Message.objects.filter(chat_id=OuterRef('chat_id')).order_by('-sent').values('sent')[:1]
+        ),
+    ).values(
+        *PROJECT_FIELDS, 'event_start', 'next_task_id', 'next_task_title', 'next_task_deadline',
+        'overdue', 'members', 'last_message_at'
+    ).first()
+    if project is None:
+        return None
+
+    totals = {
+        row['status_id']: row
+        for row in Task.objects.filter(project_id=project_id).values('status_id').annotate(
+            count=Count('id'), duration=Sum('duration')
+        ).order_by()
+    }
+    statuses = [
+        {'status': status_id, 'name': name,
+         'count': totals.get(status_id, {}).get('count', 0),
+         'duration': totals.get(status_id, {}).get('duration') or 0}
+        for status_id, name in Status.objects.order_by('id').values_list('id', 'name')
+    ]
+
+    next_deadline = None
+    if project['next_task_id'] is not None:
+        next_deadline = {
+            'task': project['next_task_id'],
+            'title': project['next_task_title'],
+            'deadline': project['next_task_deadline'],
+        }
+
+    return {
+        'id': project['id'],
+        'name': project['name'],
+        'status': project['status_id'],
+        'event': project['event_id'],
+        'event_start': project['event_start'],
+        'deadline': project['deadline'],
+        'priority': project['priority'],
+        'organisation': project['organisation_id'],
+        'chat': project['chat_id'],
+        'tasks': {
+            'count': sum(status['count'] for status in statuses),
+            'by_status': statuses,
+            'overdue': project['overdue'],
+        },
+        'next_deadline': next_deadline,
+        'members': project['members'],
+        'last_message_at': project['last_message_at'],
+    }
+
+
+def with_task_stats(queryset):
+    """
+    Annotate projects with open/done task counts, total and remaining
+    duration and the nearest open task deadline, aggregated in the same
+    query as the page. The projects are re-selected by id first, so the
+    JOIN on tasks can't multiply with the joins of an access filter.
+    """
+    done = Q(task__status_id=DONE_STATUS_ID)
+    return Project.objects.filter(pk__in=queryset.values('pk')).select_related(
+        'status', 'event__calendar__organisation', 'chat__organisation'
+    ).annotate(
+        open_tasks=Count('task', filter=~done),
+        done_tasks=Count('task', filter=done),
+        total_duration=Coalesce(Sum('task__duration'), 0),
+        remaining_duration=Coalesce(Sum('task__duration', filter=~done), 0),
+        next_deadline=Min('task__deadline', filter=~done),
+    )
@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache_utils import bump_version
+from .calendar_window import invalidate_calendar_views
+from .ical_feeds import invalidate_feeds
+from .models import ROLE_LEVEL_TEAM, Calendar, Chat, Project, Task
+from .reminders import notify_deadlines
+
+
+def project_scope(project_id):
+    """Cache scope of everything computed from a project's tasks"""
+    return f"project:{project_id}"
+
+
+def invalidate_projects(project_ids):
+    for project_id in set(project_ids):
+        if project_id:
+            bump_version(project_scope(project_id))
+
+
+def build_project_chat(project):
+    return Chat(
+        organisation_id=project.organisation_id,
+        name=f"Project Chat: {project.name}",
+        min_role_level=ROLE_LEVEL_TEAM
+    )
+
+
+def create_project(**data):
+    """
+    Create one project together with its chat: one insert per table.
+    The project's post_save receivers run as usual.
+    """
+    with transaction.atomic():
+        project = Project(**data)
+        if project.chat_id is None:
+            chat = build_project_chat(project)
+            chat.save()
+            project.chat = chat
+        project.save()
+    return project
+
+
+def create_projects(projects):
+    """
+    Insert unsaved Project instances and a chat for each one that has none,
+    with one bulk insert for the chats and one for the projects.
+
+    bulk_create skips post_save, so the caches the project receivers would
+    invalidate are invalidated here once for the whole batch.
+    """
+    with transaction.atomic():
+        without_chat = [project for project in projects if project.chat_id is None]
+        chats = Chat.objects.bulk_create([build_project_chat(project) for project in without_chat])
+        for project, chat in zip(without_chat, chats):
+            project.chat = chat
+
+        Project.objects.bulk_create(projects)
+        notify_deadlines('project', [project.id for project in projects if project.deadline])
+
+        organisation_ids = {project.organisation_id for project in projects}
+        transaction.on_commit(lambda: invalidate_calendar_views(organisation_ids))
+        transaction.on_commit(lambda: invalidate_feeds(
+            Calendar.objects.filter(organisation_id__in=organisation_ids).values_list('id', flat=True)
+        ))
+
+    return projects
+
+
+@receiver(pre_delete, sender=Task)
+def remember_dependent_projects(sender, instance, **kwargs):
+    # Dependent tasks lose their dependency through SET_NULL, which sends no signals
+    instance._dependent_projects = list(
+        Task.objects.filter(dependent_on_task=instance).values_list('project_id', flat=True).distinct()
+    )
+
+
+@receiver(pre_save, sender=Task)
+def remember_task_project(sender, instance, **kwargs):
+    # A task moved to another project must also leave the old project's caches
+    instance._project_previous = None
+    if instance.pk:
+        instance._project_previous = Task.objects.filter(pk=instance.pk).values_list(
+            'project_id', 'status_id'
+        ).first()
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_project(sender, instance, **kwargs):
+    project_ids = [instance.project_id] + getattr(instance, '_dependent_projects', [])
+    previous = getattr(instance, '_project_previous', None)
+    if previous:
+        project_ids.append(previous[0])
+        if previous[1] != instance.status_id:
+            # Task graphs of other projects show whether their dependencies are done
+            project_ids.extend(
+                Task.objects.filter(dependent_on_task=instance).values_list('project_id', flat=True).distinct()
+            )
+    invalidate_projects(project_ids)
@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, connections, transaction
+from rest_framework import serializers
+
+from .invite_codes import invite_code_allocator
+from .memberships import bump_membership_version
+from .models import Organisation, Role, UserOrganisation
+
+User = get_user_model()
+
+# Users per POST /users/bulk/; passwords are hashed in the request, so
+# larger imports go through `manage.py provision_users`
+PROVISION_API_MAX = 50
+# Below this many passwords starting worker processes costs more than it saves
+PARALLEL_HASH_THRESHOLD = 8
+MAX_HASH_WORKERS = 8
+
+
+class ProvisionUserSerializer(serializers.Serializer):
+    username = serializers.RegexField(r'^[\w.@+-]+\Z', max_length=150)
+    password = serializers.CharField(min_length=8, max_length=128)
+    email = serializers.EmailField(required=False, allow_blank=True, default='')
+    first_name = serializers.CharField(required=False, allow_blank=True, max_length=150, default='')
+    last_name = serializers.CharField(required=False, allow_blank=True, max_length=150, default='')
+    organisation = serializers.IntegerField(required=False, allow_null=True)
+    role = serializers.IntegerField(required=False, allow_null=True)
+
+
+def _close_connections():
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+
+
+def hash_passwords(passwords, workers=1):
+    """
+    Hash passwords with the configured hasher. PBKDF2 is CPU-bound and holds
+    the GIL, so with workers > 1 larger batches are spread over a process
+    pool. Only `manage.py provision_users` asks for one: never fork from a
+    web worker.
+    """
+    workers = min(workers or 1, MAX_HASH_WORKERS, os.cpu_count() or 1)
+    if len(passwords) < PARALLEL_HASH_THRESHOLD or workers == 1:
+        return [make_password(password) for password in passwords]
+
+    _close_connections()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_close_connections
+    ) as pool:
+        return list(pool.map(make_password, passwords, chunksize=4))
+
+
+def provision_users(rows, organisation_id=None, role_id=None, workers=1):
+    """
+    Create many users at once. Each row may name its own organisation and
+    role, otherwise the defaults passed in are used.
+
+    Rows are validated up front (usernames are checked with one query),
+    passwords are hashed (in parallel if `workers` > 1), invite codes come from one batch
+    allocation, and users plus memberships are inserted with bulk_create.
+    A bad row is reported in the results and doesn't abort the batch.
+    """
+    results = [None] * len(rows)
+    valid = []  # (index, validated data)
+
+    for index, row in enumerate(rows):
+        serializer = ProvisionUserSerializer(data=row)
+        if serializer.is_valid():
+            data = dict(serializer.validated_data)
+            data['organisation'] = data.get('organisation') or organisation_id
+            data['role'] = data.get('role') or role_id
+            valid.append((index, data))
+        else:
+            results[index] = {'row': index + 1, 'errors': serializer.errors}
+
+    # Set-based checks: existing usernames, organisations and roles
+    usernames = [data['username'] for _, data in valid]
+    taken = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    org_ids = set(Organisation.objects.filter(
+        id__in={data['organisation'] for _, data in valid if data['organisation']}
+    ).values_list('id', flat=True))
+    role_ids = set(Role.objects.filter(
+        id__in={data['role'] for _, data in valid if data['role']}
+    ).values_list('id', flat=True))
+
+    accepted = []
+    seen = set()
+    for index, data in valid:
+        error = None
+        if data['username'] in taken or data['username'] in seen:
+            error = {'username': ["A user with that username already exists."]}
+        elif bool(data['organisation']) != bool(data['role']):
+            error = {'organisation': ["organisation and role must be given together."]}
+        elif data['organisation'] and data['organisation'] not in org_ids:
+            error = {'organisation': ["Organisation not found."]}
+        elif data['role'] and data['role'] not in role_ids:
+            error = {'role': ["Role not found."]}
+
+        if error:
+            results[index] = {'row': index + 1, 'errors': error}
+        else:
+            seen.add(data['username'])
+            accepted.append((index, data))
+
+    if accepted:
+        hashes = hash_passwords([data['password'] for _, data in accepted], workers)
+        codes = invite_code_allocator.allocate(len(accepted))
+
+        users = [
+            User(
+                username=data['username'],
+                email=User.objects.normalize_email(data['email']),
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+                password=password_hash,
+                invite_code=code,
+            )
+            for (_, data), password_hash, code in zip(accepted, hashes, codes)
+        ]
+
+        try:
+            with transaction.atomic():
+                _insert_users(users, [data for _, data in accepted])
+            created = [True] * len(users)
+        except IntegrityError:
+            # A row conflicts with something created in the meantime: insert row by row
+            created = []
+            for user, (_, data) in zip(users, accepted):
+                user.pk = None
+                try:
+                    with transaction.atomic():
+                        _insert_users([user], [data])
+                    created.append(True)
+                except IntegrityError:
+                    created.append(False)
+
+        if not all(created):
+            taken = set(User.objects.filter(
+                username__in=[user.username for user, ok in zip(users, created) if not ok]
+            ).values_list('username', flat=True))
+
+        for user, (index, _), ok in zip(users, accepted, created):
+            if ok:
+                results[index] = {'row': index + 1, 'id': user.id, 'username': user.username}
+            elif user.username in taken:
+                results[index] = {
+                    'row': index + 1,
+                    'errors': {'username': ["A user with that username already exists."]}
+                }
+            else:
+                results[index] = {
+                    'row': index + 1,
+                    'errors': {'non_field_errors': ["This user conflicts with an existing user or membership."]}
+                }
+
+    return {
+        'created': sum(1 for result in results if 'id' in result),
+        'failed': sum(1 for result in results if 'errors' in result),
+        'results': results,
+    }
+
+
+def _insert_users(users, rows):
+    User.objects.bulk_create(users)
+    memberships = UserOrganisation.objects.bulk_create([
+        UserOrganisation(user=user, organisation_id=data['organisation'], role_id=data['role'])
+        for user, data in zip(users, rows) if data['organisation']
+    ])
+    # bulk_create sends no post_save, so do what membership_changed would
+    bump_membership_version([membership.user_id for membership in memberships])
@@ -0,0 +1,221 @@
+"""
+Deadline reminders for tasks and projects, sent by `manage.py run_reminders`.
+
+The worker keeps the reminders due before its next rescan in a min-heap and
+sleeps until the earliest one. On PostgreSQL the receivers below send a
+NOTIFY when a deadline may have moved, so the worker reloads just those
+rows instead of rescanning the tables. Before sending, the due reminders are
+checked against the database in one query per model, so a missed
+notification can delay a reminder until the next rescan but never send a
+stale one. Reminders are posted to the project chats, one message per chat
+and wake-up, by the DEADLINE_REMINDER_SENDER user.
+"""
+import heapq
+import select
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.timesince import timeuntil
+
+from .models import DONE_STATUS_ID, Message, Project, Task, User
+
+REMINDER_LEADS = getattr(settings, 'DEADLINE_REMINDER_LEADS', [timedelta(days=1), timedelta(hours=1)])
+NOTIFY_CHANNEL = 'deadline_changed'
+# NOTIFY payloads are limited to 8000 bytes
+NOTIFY_CHUNK_SIZE = 500
+
+
+def _deadlines(kind):
+    # Done tasks and projects get no reminders
+    model = Task if kind == 'task' else Project
+    return model.objects.exclude(status_id=DONE_STATUS_ID)
+
+
+def reminder_sender():
+    """The (inactive, password-less) user reminder messages are posted as"""
+    username = getattr(settings, 'DEADLINE_REMINDER_SENDER', 'delegator')
+    sender = User.objects.filter(username=username).first()
+    if sender is None:
+        sender = User(username=username, first_name='Delegator', is_active=False)
+        sender.set_unusable_password()
+        sender.save()
+    return sender
+
+
+def notify_deadlines(kind, ids):
+    """
+    Tell a running worker that the deadlines of these tasks or projects may
+    have changed. NOTIFY is delivered on commit, so rolled back changes are
+    never announced. A no-op on other databases, where the worker rescans.
+    """
+    ids = sorted({object_id for object_id in ids if object_id})
+    if not ids or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), NOTIFY_CHUNK_SIZE):
+            payload = f"{kind}:" + ','.join(map(str, ids[start:start + NOTIFY_CHUNK_SIZE]))
+            cursor.execute("SELECT pg_notify(%s, %s)", [NOTIFY_CHANNEL, payload])
+
+
+class ReminderSchedule:
+    """
+    Min-heap of (send at, kind, id, generation, deadline, lead) entries.
+    Every time a deadline is (re)scheduled its generation goes up, and an
+    entry is stale once its generation is no longer the current one. Stale
+    entries are dropped when they reach the top instead of being searched
+    for on every change.
+    """
+
+    def __init__(self, leads=REMINDER_LEADS, horizon=timedelta(hours=1)):
+        self.leads = sorted(leads)
+        self.horizon = horizon
+        self.heap = []
+        self.deadlines = {}  # (kind, id) -> (deadline, generation) of the current entries
+        self.generation = 0
+
+    def load(self, now, kind=None, ids=None):
+        """
+        Schedule the deadlines whose reminders fall within the horizon, or
+        reload just `ids` of `kind` after a change notification
+        """
+        if ids is None:
+            self.deadlines = {key: current for key, current in self.deadlines.items() if current[0] > now}
+        window_end = now + self.horizon + self.leads[-1]
+
+        for model_kind in ('task', 'project'):
+            if kind is not None and kind != model_kind:
+                continue
+            queryset = _deadlines(model_kind)
+            if ids is None:
+                queryset = queryset.filter(deadline__gt=now, deadline__lte=window_end)
+            else:
+                queryset = queryset.filter(id__in=ids)
+            rows = dict(queryset.values_list('id', 'deadline'))
+
+            for object_id in set(ids or ()) - set(rows):
+                # Deleted, done or no longer matching
+                self.deadlines.pop((model_kind, object_id), None)
+            for object_id, deadline in rows.items():
+                if deadline is not None and deadline <= window_end:
+                    self.schedule(model_kind, object_id, deadline, now)
+                else:
+                    self.deadlines.pop((model_kind, object_id), None)
+
+    def schedule(self, kind, object_id, deadline, now):
+        key = (kind, object_id)
+        current = self.deadlines.get(key)
+        if current is not None and current[0] == deadline:
+            return
+        self.generation += 1
+        self.deadlines[key] = (deadline, self.generation)
+        for lead in self.leads:
+            send_at = deadline - lead
+            if send_at > now:
+                heapq.heappush(self.heap, (send_at, kind, object_id, self.generation, deadline, lead))
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, until):
+        """Current entries due by `until`, earliest first"""
+        due = []
+        while self.heap and self.heap[0][0] <= until:
+            send_at, kind, object_id, generation, deadline, lead = heapq.heappop(self.heap)
+            if self.deadlines.get((kind, object_id)) == (deadline, generation):
+                due.append((kind, object_id, deadline, lead))
+        return due
+
+
+def build_reminders(due, now=None):
+    """
+    Group due entries by project chat as {chat id: [reminder text]}.
+    Entries whose deadline changed in the meantime are dropped.
+    """
+    now = now or timezone.now()
+    task_ids = {object_id for kind, object_id, _, _ in due if kind == 'task'}
+    project_ids = {object_id for kind, object_id, _, _ in due if kind == 'project'}
+
+    tasks = {
+        task['id']: task for task in _deadlines('task').filter(id__in=task_ids).values(
+            'id', 'title', 'deadline', 'project__chat_id', 'user__username'
+        )
+    }
+    projects = {
+        project['id']: project for project in _deadlines('project').filter(id__in=project_ids).values(
+            'id', 'name', 'deadline', 'chat_id'
+        )
+    }
+
+    batches = defaultdict(list)
+    for kind, object_id, deadline, lead in due:
+        row = (tasks if kind == 'task' else projects).get(object_id)
+        if row is None or row['deadline'] != deadline:
+            continue
+
+        if kind == 'task':
+            chat_id = row['project__chat_id']
+            text = f'Reminder: task "{row["title"]}" (@{row["user__username"]}) is due in {timeuntil(deadline, now)}.'
+        else:
+            chat_id = row['chat_id']
+            text = f'Reminder: project "{row["name"]}" is due in {timeuntil(deadline, now)}.'
+        if chat_id:
+            batches[chat_id].append(text)
+    return batches
+
+
+def deliver_reminders(batches, sender):
+    """Post one message per project chat with all of its due reminders, in one INSERT"""
+    Message.objects.bulk_create([
+        Message(chat_id=chat_id, user=sender, content='\n'.join(texts))
+        for chat_id, texts in batches.items()
+    ])
+    return sum(len(texts) for texts in batches.values())
+
+
+class DeadlineListener:
+    """LISTENs for notify_deadlines() on the default PostgreSQL connection"""
+
+    def __init__(self):
+        # Django connections are in autocommit mode, so LISTEN applies at once
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        self.connection = connection.connection
+
+    def wait(self, timeout):
+        """Block up to `timeout` seconds; returns {kind: ids} of the changes"""
+        # Notifications that arrived during our own queries are already buffered
+        self.connection.poll()
+        if not self.connection.notifies:
+            select.select([self.connection], [], [], max(timeout, 0))
+            self.connection.poll()
+
+        changes = defaultdict(set)
+        while self.connection.notifies:
+            kind, _, ids = self.connection.notifies.pop(0).payload.partition(':')
+            changes[kind].update(int(object_id) for object_id in ids.split(',') if object_id)
+        return changes
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def notify_task_deadline(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields and not {'deadline', 'status', 'status_id'} & set(update_fields):
+        return
+    if created and instance.deadline is None:
+        return
+    notify_deadlines('task', [instance.id])
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def notify_project_deadline(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields and not {'deadline', 'status', 'status_id'} & set(update_fields):
+        return
+    if created and instance.deadline is None:
+        return
+    notify_deadlines('project', [instance.id])
@@ -1,12 +1,17 @@
 from rest_framework import serializers
+from django.db import models
 from django.contrib.auth import get_user_model
 from .models import (
     Organisation, Role, UserOrganisation, Calendar, Event, Project, Chat,
-    ChatUser, Message, Song, Timetable, Setlist, History, Status, Task, Recording, External, ChatAccessView, OrganisationInvitation, BugReport
+    ChatUser, Message, Song, Timetable, Setlist, History, Status, Task, Recording, External, ChatAccessView, OrganisationInvitation, BugReport,
+    PersonalAccessToken
 )
 
+from .projects import create_project
+from .task_graph import depends_on
+
 # Add this serializer to your serializers.py file
-from .calendar_token import CalendarSubscription
+from .calendar_token import CalendarSubscription, build_feed_url, calendar_feed_tokens, user_feed_tokens
 
 User = get_user_model()
 
@@ -24,12 +29,9 @@ class UserSerializer(serializers.ModelSerializer):
         # Extract the password
         password = validated_data.pop('password')
         
-        # Create the user instance
-        user = User.objects.create_user(**validated_data)
-        
-        # Set the password properly (this handles the hashing)
-        user.set_password(password)
-        user.save()
+        # Create the user instance, create_user hashes the password
+        # so this is a single hash and a single write
+        user = User.objects.create_user(password=password, **validated_data)
         
         return user
     
@@ -122,6 +124,23 @@ class ProjectSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'event', 'deadline', 'priority', 'event_details', 
                  'organisation', 'status', 'chat', 'chat_details']  # Add chat fields
 
+    def create(self, validated_data):
+        # Creates the project chat in the same go, see api/projects.py
+        return create_project(**validated_data)
+
+class ProjectStatsSerializer(ProjectSerializer):
+    """Project list entry with the task statistics of api.project_summary.with_task_stats"""
+    open_tasks = serializers.IntegerField(read_only=True)
+    done_tasks = serializers.IntegerField(read_only=True)
+    total_duration = serializers.IntegerField(read_only=True)
+    remaining_duration = serializers.IntegerField(read_only=True)
+    next_deadline = serializers.DateTimeField(read_only=True)
+
+    class Meta(ProjectSerializer.Meta):
+        fields = ProjectSerializer.Meta.fields + [
+            'open_tasks', 'done_tasks', 'total_duration', 'remaining_duration', 'next_deadline'
+        ]
+
 
 class ChatUserSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='user', read_only=True)
@@ -160,7 +179,13 @@ class SetlistSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Setlist
-        fields = ['id', 'event', 'time', 'name', 'song', 'event_details', 'song_details']
+        fields = ['id', 'event', 'time', 'name', 'song', 'position', 'event_details', 'song_details']
+        read_only_fields = ['position']
+
+class MoveSerializer(serializers.Serializer):
+    """Where to move a task or setlist entry: between two of its siblings"""
+    after = serializers.IntegerField(required=False, allow_null=True)
+    before = serializers.IntegerField(required=False, allow_null=True)
 
 class HistorySerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='user', read_only=True)
@@ -185,15 +210,23 @@ class TaskSerializer(serializers.ModelSerializer):
         model = Task
         fields = [
             'id', 'user', 'project', 'title', 'content', 'duration', 'status',
-            'created', 'updated', 'deadline', 'dependent_on_task', 'event',
+            'created', 'updated', 'deadline', 'dependent_on_task', 'event', 'position',
             'user_details', 'project_details', 'status_details', 'event_details',
             'dependent_task_details'
         ]
-        read_only_fields = ['created', 'updated']
+        read_only_fields = ['created', 'updated', 'position']
         extra_kwargs = {
             'user': {'required': False}  # Make user optional in the serializer
         }
         
+    def validate(self, data):
+        dependency = data.get('dependent_on_task')
+        if dependency and self.instance and depends_on(dependency.id, self.instance.id):
+            raise serializers.ValidationError({
+                'dependent_on_task': "This dependency would create a cycle."
+            })
+        return data
+
     def get_dependent_task_details(self, obj):
         if obj.dependent_on_task:
             return {
@@ -280,40 +313,84 @@ class CalendarSubscriptionSerializer(serializers.ModelSerializer):
         return "All Calendars"
 
 
+class IcalUrlListSerializer(serializers.ListSerializer):
+    """
+    Resolves the subscription tokens of a whole page before the rows are
+    serialized, creating the missing ones with one bulk insert, so
+    get_ical_url() only reads from the resolved tokens.
+    """
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        self.child.ical_tokens = self.child.resolve_ical_tokens(items, create=True)
+        return super().to_representation(items)
+
+
+class IcalUrlMixin:
+    """
+    Subscriptions are only created for the top-level response: a page
+    through IcalUrlListSerializer or a single object. Nested objects only
+    read existing subscriptions and have an empty ical_url otherwise.
+    """
+    ical_url_name = None
+    # (request, ids, create) -> {id: token}, see api/calendar_token.py
+    ical_token_resolver = None
+    ical_tokens = None
+    
+    def resolve_ical_tokens(self, objs, create=False):
+        return self.ical_token_resolver(self.context.get('request'), [obj.id for obj in objs], create)
+    
+    def to_representation(self, instance):
+        if self.parent is None and self.ical_tokens is None:
+            self.ical_tokens = self.resolve_ical_tokens([instance], create=True)
+        return super().to_representation(instance)
+    
+    def get_ical_url(self, obj):
+        if self.ical_tokens is None:
+            self.ical_tokens = {}
+        if obj.id not in self.ical_tokens:
+            self.ical_tokens.update(self.resolve_ical_tokens([obj]))
+            self.ical_tokens.setdefault(obj.id, None)
+        
+        token = self.ical_tokens[obj.id]
+        if not token:
+            return ""
+        return build_feed_url(self.ical_url_name, token, self.context.get('request'))
+
+
 # Also update your CalendarSerializer to include the iCal URL
-class CalendarSerializer(serializers.ModelSerializer):
+class CalendarSerializer(IcalUrlMixin, serializers.ModelSerializer):
     organisation_details = OrganisationSerializer(source='organisation', read_only=True)
     ical_url = serializers.SerializerMethodField()
+    ical_url_name = 'calendar-ical'
+    # Calendar subscriptions belong to the user asking for them
+    ical_token_resolver = staticmethod(calendar_feed_tokens)
     
     class Meta:
         model = Calendar
         fields = ['id', 'organisation', 'organisation_details', 'ical_url']
-    
-    def get_ical_url(self, obj):
-        request = self.context.get('request')
-        return obj.get_ical_url(request)
+        list_serializer_class = IcalUrlListSerializer
 
 
 # Update your UserSerializer to include an iCal URL for all events
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(IcalUrlMixin, serializers.ModelSerializer):
     organisations = serializers.SerializerMethodField()
     tasks = TaskSerializer(source='task_set', many=True, read_only=True)
     messages = MessageSerializer(source='message_set', many=True, read_only=True)
     ical_url = serializers.SerializerMethodField()
+    ical_url_name = 'user-ical'
+    ical_token_resolver = staticmethod(user_feed_tokens)
     
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'created',
                  'organisations', 'tasks', 'messages', 'ical_url', 'is_premium']
         read_only_fields = ['created', 'is_premium']
+        list_serializer_class = IcalUrlListSerializer
     
     def get_organisations(self, obj):
         user_orgs = UserOrganisation.objects.filter(user=obj)
         return UserOrganisationSerializer(user_orgs, many=True).data
-        
-    def get_ical_url(self, obj):
-        request = self.context.get('request')
-        return obj.get_ical_url(request)
+
 
 class OrganisationInvitationSerializer(serializers.ModelSerializer):
     invite_code = serializers.CharField()
@@ -333,10 +410,21 @@ class OrganisationInvitationSerializer(serializers.ModelSerializer):
         return obj.token
     
     def get_can_accept(self, obj):
-        return obj.can_accept()
+        return not obj.accepted and not obj.declined and not self.get_is_expired(obj)
     
     def get_is_expired(self, obj):
-        return obj.is_expired()
+        # Querysets from api.invitations.with_expiry carry the flag already
+        expired = getattr(obj, 'expired', None)
+        if expired is None:
+            expired = obj.is_expired()
+        return expired
+
+class BulkInvitationSerializer(serializers.Serializer):
+    organisation = serializers.PrimaryKeyRelatedField(queryset=Organisation.objects.all())
+    role = serializers.PrimaryKeyRelatedField(queryset=Role.objects.all())
+    invite_codes = serializers.ListField(
+        child=serializers.CharField(max_length=8), allow_empty=False, max_length=1000
+    )
 
 class InviteCodeSerializer(serializers.ModelSerializer):    
     class Meta:
@@ -363,4 +451,10 @@ class BugReportSerializer(serializers.ModelSerializer):
             if not data.get('email'):
                 raise serializers.ValidationError("Email is required for anonymous reports.")
         
-        return data
\ No newline at end of file
+        return data
+
+class PersonalAccessTokenSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PersonalAccessToken
+        fields = ['id', 'name', 'prefix', 'scope', 'created', 'expires', 'last_used', 'revoked']
+        read_only_fields = ['prefix', 'created', 'last_used', 'revoked']
@@ -0,0 +1,122 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .models import Song, SongSequence
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = ['nr', 'name', 'description']
+FILE_TYPES = ('csv', 'json', 'jsonl')
+
+
+class SongImportRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+def detect_file_type(upload, requested=None):
+    """Pick the import format from the request or the file extension"""
+    if requested:
+        return requested.lower()
+    extension = upload.name.rsplit('.', 1)[-1].lower() if '.' in upload.name else ''
+    if extension == 'ndjson':
+        return 'jsonl'
+    return extension
+
+
+def iter_song_rows(upload, file_type):
+    """
+    Yield the rows of an uploaded song list as dicts.
+    CSV and JSON Lines files are read line by line, a JSON array is loaded whole.
+    """
+    if file_type == 'csv':
+        yield from csv.DictReader(codecs.iterdecode(upload, 'utf-8-sig'))
+    elif file_type == 'jsonl':
+        for line in codecs.iterdecode(upload, 'utf-8-sig'):
+            if line.strip():
+                yield json.loads(line)
+    elif file_type == 'json':
+        rows = json.load(codecs.getreader('utf-8-sig')(upload))
+        if not isinstance(rows, list):
+            raise ValueError("Expected a JSON array of songs.")
+        yield from rows
+    else:
+        raise ValueError(f"Unsupported file type '{file_type}', use one of: {', '.join(FILE_TYPES)}.")
+
+
+def import_songs(organisation, rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate and insert song rows in batches. Each batch reserves one block
+    of song numbers and is written with a single bulk_create. Invalid rows
+    are reported by their row number (starting at 1) and skipped.
+    """
+    created = 0
+    errors = []
+    row_number = 0
+    rows = iter(rows)
+
+    with transaction.atomic():
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+
+            valid = []
+            for row in batch:
+                row_number += 1
+                serializer = SongImportRowSerializer(data=row if isinstance(row, dict) else {})
+                if serializer.is_valid():
+                    valid.append(serializer.validated_data)
+                else:
+                    errors.append({'row': row_number, 'errors': serializer.errors})
+
+            if not valid:
+                continue
+
+            first_nr = SongSequence.reserve(organisation.id, len(valid))
+            Song.objects.bulk_create([
+                Song(
+                    organisation=organisation,
+                    nr=first_nr + offset,
+                    name=data['name'],
+                    description=data.get('description', '')
+                )
+                for offset, data in enumerate(valid)
+            ])
+            created += len(valid)
+
+    return {'created': created, 'failed': len(errors), 'errors': errors}
+
+
+class _Echo:
+    """File-like object that hands back what is written, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+def _export_rows(organisation):
+    # iterator() streams from a server-side cursor on PostgreSQL
+    return Song.objects.filter(organisation=organisation).order_by('nr').values_list(
+        *EXPORT_FIELDS
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def stream_songs_csv(organisation):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in _export_rows(organisation):
+        yield writer.writerow(row)
+
+
+def stream_songs_json(organisation):
+    yield '['
+    separator = ''
+    for row in _export_rows(organisation):
+        yield separator + json.dumps(dict(zip(EXPORT_FIELDS, row)))
+        separator = ','
+    yield ']'
@@ -0,0 +1,127 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from .calendar_window import invalidate_calendar_views
+from .ical_feeds import invalidate_feeds
+from .memberships import get_memberships
+from .models import Event, External, Project, Status, Task, User
+from .projects import invalidate_projects
+from .reminders import notify_deadlines
+
+TASK_BULK_MAX = 500
+# Changeable field -> model attribute
+TASK_BULK_FIELDS = {'status': 'status_id', 'position': 'position', 'user': 'user_id', 'deadline': 'deadline'}
+
+
+class TaskChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.IntegerField(required=False)
+    position = serializers.RegexField(r'^[0-9a-z]*[1-9a-z]$', max_length=255, required=False)
+    user = serializers.IntegerField(required=False)
+    deadline = serializers.DateTimeField(required=False, allow_null=True)
+
+
+def editable_tasks(request, task_ids):
+    """The subset of `task_ids` the user may edit, without the DISTINCT of TaskViewSet"""
+    tasks = Task.objects.filter(id__in=task_ids)
+    user = request.user
+    if user.is_staff:
+        return tasks
+    return tasks.filter(
+        Q(user=user) |
+        Q(project_id__in=External.objects.filter(user=user).values('project_id')) |
+        Q(project__organisation_id__in=list(get_memberships(request)))
+    )
+
+
+def apply_task_changes(request, rows):
+    """
+    Apply a list of {id, status?, position?, user?, deadline?} changes.
+    Access, statuses and users are checked with one query each, then all
+    valid changes are written with one bulk_update. Returns a result per row.
+    """
+    results = [None] * len(rows)
+    changes = {}  # task id -> (row index, validated data)
+
+    for index, row in enumerate(rows):
+        serializer = TaskChangeSerializer(data=row if isinstance(row, dict) else {})
+        if not serializer.is_valid():
+            results[index] = {'id': row.get('id') if isinstance(row, dict) else None, 'errors': serializer.errors}
+        elif serializer.validated_data['id'] in changes:
+            results[index] = {'id': serializer.validated_data['id'], 'errors': {'id': ["Duplicate task."]}}
+        else:
+            changes[serializer.validated_data['id']] = (index, serializer.validated_data)
+
+    status_ids = set(Status.objects.filter(
+        id__in={data['status'] for _, data in changes.values() if 'status' in data}
+    ).values_list('id', flat=True))
+    user_ids = set(User.objects.filter(
+        id__in={data['user'] for _, data in changes.values() if 'user' in data}
+    ).values_list('id', flat=True))
+    tasks = {
+        task.id: task for task in editable_tasks(request, list(changes)).only(
+            'id', 'project_id', 'event_id', *TASK_BULK_FIELDS.values()
+        )
+    }
+
+    updated = []
+    fields = set()
+    old_users = set()
+    for task_id, (index, data) in changes.items():
+        task = tasks.get(task_id)
+        if task is None:
+            results[index] = {'id': task_id, 'errors': {'id': ["Task not found."]}}
+            continue
+        if 'status' in data and data['status'] not in status_ids:
+            results[index] = {'id': task_id, 'errors': {'status': ["Invalid status."]}}
+            continue
+        if 'user' in data and data['user'] not in user_ids:
+            results[index] = {'id': task_id, 'errors': {'user': ["Invalid user."]}}
+            continue
+
+        old_users.add(task.user_id)
+        for field, attribute in TASK_BULK_FIELDS.items():
+            if field in data:
+                setattr(task, attribute, data[field])
+                fields.add(field)
+        updated.append(task)
+        results[index] = {
+            'id': task.id, 'status': task.status_id, 'position': task.position,
+            'user': task.user_id, 'deadline': task.deadline,
+        }
+
+    if updated:
+        now = timezone.now()
+        for task in updated:
+            task.updated = now
+
+        with transaction.atomic():
+            Task.objects.bulk_update(updated, sorted(fields) + ['updated'], batch_size=TASK_BULK_MAX)
+
+            # bulk_update sends no post_save, so invalidate what the Task receivers would
+            project_ids = {task.project_id for task in updated}
+            cached_project_ids = set(project_ids)
+            if 'status' in fields:
+                # Task graphs of other projects show whether their dependencies are done
+                cached_project_ids.update(Task.objects.filter(
+                    dependent_on_task__in=[task.id for task in updated]
+                ).values_list('project_id', flat=True).distinct())
+            event_ids = {task.event_id for task in updated if task.event_id}
+            user_ids = old_users | {task.user_id for task in updated}
+            transaction.on_commit(lambda: invalidate_projects(cached_project_ids))
+            transaction.on_commit(lambda: invalidate_calendar_views(
+                Project.objects.filter(id__in=project_ids).values_list('organisation_id', flat=True), user_ids
+            ))
+            transaction.on_commit(lambda: invalidate_feeds(
+                Event.objects.filter(id__in=event_ids).values_list('calendar_id', flat=True), user_ids
+            ))
+            if fields & {'deadline', 'status'}:
+                notify_deadlines('task', [task.id for task in updated])
+
+    return {
+        'updated': len(updated),
+        'failed': sum(1 for result in results if 'errors' in result),
+        'results': results,
+    }
@@ -0,0 +1,110 @@
+from collections import defaultdict, deque
+
+from django.db.models import Subquery
+
+from .models import DONE_STATUS_ID, Task
+
+
+def depends_on(task_id, other_id):
+    """
+    True if task `task_id` is `other_id` or (transitively) depends on it.
+    Used to reject a dependency that would close a cycle. Edges are loaded
+    a whole project at a time, so a chain within one project costs one query.
+    """
+    edges = {}
+    loaded_for = set()
+    current = task_id
+    seen = set()
+
+    while current is not None and current not in seen:
+        if current == other_id:
+            return True
+        seen.add(current)
+
+        if current not in edges and current not in loaded_for:
+            loaded_for.add(current)
+            edges.update(Task.objects.filter(
+                project_id=Subquery(Task.objects.filter(id=current).values('project_id')[:1])
+            ).values_list('id', 'dependent_on_task_id'))
+        current = edges.get(current)
+
+    return False
+
+
+def build_task_graph(project_id):
+    """
+    Dependency graph of a project's tasks: a topological order, the critical
+    path weighted by duration, and which open tasks are ready or blocked.
+    Tasks in or depending on a cycle (from data saved before cycles were
+    rejected) are left out of the order and reported under 'cycles'.
+    """
+    rows = Task.objects.filter(project_id=project_id).order_by('id').values_list(
+        'id', 'title', 'status_id', 'duration', 'dependent_on_task_id'
+    )
+    tasks = {
+        task_id: {'id': task_id, 'title': title, 'status': status_id,
+                  'duration': max(duration or 0, 0), 'dependent_on_task': dependency}
+        for task_id, title, status_id, duration, dependency in rows
+    }
+
+    # Dependencies on tasks of other projects only matter for their status
+    outside = {task['dependent_on_task'] for task in tasks.values()
+               if task['dependent_on_task'] and task['dependent_on_task'] not in tasks}
+    statuses = {task_id: task['status'] for task_id, task in tasks.items()}
+    if outside:
+        statuses.update(Task.objects.filter(id__in=outside).values_list('id', 'status_id'))
+
+    dependents = defaultdict(list)
+    roots = []
+    for task_id, task in tasks.items():
+        if task['dependent_on_task'] in tasks:
+            dependents[task['dependent_on_task']].append(task_id)
+        else:
+            roots.append(task_id)
+
+    # Each task has at most one dependency, so the graph is a forest and a
+    # breadth-first walk from the roots is a topological order
+    order = []
+    queue = deque(roots)
+    while queue:
+        task_id = queue.popleft()
+        task = tasks[task_id]
+        dependency = tasks.get(task['dependent_on_task'])
+        task['earliest_start'] = dependency['earliest_finish'] if dependency else 0
+        task['earliest_finish'] = task['earliest_start'] + task['duration']
+        order.append(task_id)
+        queue.extend(dependents[task_id])
+
+    ordered = set(order)
+    cycles = [task_id for task_id in tasks if task_id not in ordered]
+
+    critical_path = []
+    if order:
+        task_id = max(order, key=lambda task_id: tasks[task_id]['earliest_finish'])
+        while task_id in tasks:
+            critical_path.append(task_id)
+            task_id = tasks[task_id]['dependent_on_task']
+        critical_path.reverse()
+
+    ready, blocked = [], []
+    for task_id in order:
+        task = tasks[task_id]
+        if task['status'] == DONE_STATUS_ID:
+            continue
+        dependency = task['dependent_on_task']
+        if dependency is None or statuses.get(dependency, DONE_STATUS_ID) == DONE_STATUS_ID:
+            ready.append(task_id)
+        else:
+            blocked.append(task_id)
+    blocked.extend(task_id for task_id in cycles if tasks[task_id]['status'] != DONE_STATUS_ID)
+
+    return {
+        'project': project_id,
+        'tasks': list(tasks.values()),
+        'order': order,
+        'critical_path': critical_path,
+        'critical_path_duration': tasks[critical_path[-1]]['earliest_finish'] if critical_path else 0,
+        'ready': ready,
+        'blocked': blocked,
+        'cycles': cycles,
+    }
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CustomTokenObtainPairView
+from .views import CustomTokenObtainPairView, CustomTokenRefreshView
 from .views import register_user
 from .views import (
     UserViewSet, OrganisationViewSet, RoleViewSet, UserOrganisationViewSet,
@@ -8,13 +8,14 @@ from .views import (
     MessageViewSet, SongViewSet, TimetableViewSet, SetlistViewSet,
     HistoryViewSet, StatusViewSet, TaskViewSet, RecordingViewSet, ExternalViewSet, 
     ChatAccessViewSet, upgrade_to_premium, get_users_by_project, get_externals_by_project, get_externals_by_organisation, 
-    remove_user_from_organisation, get_all_users_by_organisation,
+    remove_user_from_organisation, get_all_users_by_organisation, get_organisation_conflicts, get_organisation_workload, calendar_view,
+    import_organisation_songs, export_organisation_songs,
     OrganisationInvitationViewSet, get_invitation_details,
-    accept_invitation, decline_invitation, my_invitations, my_profile, BugReportViewSet
+    accept_invitation, decline_invitation, my_invitations, my_profile, BugReportViewSet,
+    PersonalAccessTokenViewSet
 )
 # Update api/urls.py to include JWT views
 from rest_framework_simplejwt.views import (
-    TokenRefreshView,
     TokenVerifyView,
 )
 
@@ -48,6 +49,7 @@ router.register(r'externals', ExternalViewSet)
 router.register(r'chat-access', ChatAccessViewSet)
 router.register(r'invitations', OrganisationInvitationViewSet)
 router.register(r'bug-reports', BugReportViewSet)
+router.register(r'access-tokens', PersonalAccessTokenViewSet)
 
 # This line is crucial - make sure it exists at the bottom of the file
 urlpatterns = router.urls
@@ -58,7 +60,7 @@ urlpatterns += [
 
 # Add these to urlpatterns
 urlpatterns += [
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
 ]
 
@@ -89,6 +91,11 @@ urlpatterns += [
     path('organisations/<int:org_id>/externals/', get_externals_by_organisation, name='organisation-externals'),
     path('organisations/<int:org_id>/users/', get_all_users_by_organisation, name='organisation-all-users'),
     path('organisations/<int:org_id>/users/<int:user_id>/', remove_user_from_organisation, name='remove-user-from-org'),
+    path('organisations/<int:org_id>/conflicts/', get_organisation_conflicts, name='organisation-conflicts'),
+    path('organisations/<int:org_id>/workload/', get_organisation_workload, name='organisation-workload'),
+    path('calendar-view/', calendar_view, name='calendar-view'),
+    path('organisations/<int:org_id>/songs/import/', import_organisation_songs, name='organisation-songs-import'),
+    path('organisations/<int:org_id>/songs/export/', export_organisation_songs, name='organisation-songs-export'),
 ]
 
 urlpatterns += [
@@ -1,8 +1,12 @@
 
 
+from datetime import datetime, time
+
 from .models import UserOrganisation, Project, Chat, External, Calendar, Event
 from rest_framework.exceptions import PermissionDenied
 from django.db.models import Q, F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 def user_has_chat_access(user, chat):
     """
@@ -65,6 +69,21 @@ def get_user_accessible_calendars(user):
     # Combine accessible calendars
     return (org_calendars | project_calendars).distinct()
 
+
+def get_user_accessible_projects(user):
+    """
+    Get all projects a user has access to through:
+    1. Organization membership
+    2. Project membership (via External)
+    """
+    user_orgs = UserOrganisation.objects.filter(user=user).values_list('organisation_id', flat=True)
+    
+    org_projects = Project.objects.filter(organisation_id__in=user_orgs)
+    direct_projects = Project.objects.filter(external__user=user)
+    
+    return (org_projects | direct_projects).distinct()
+
+
 def get_user_accessible_chats(user):
     """
     Get all chats a user has access to through:
@@ -173,4 +192,26 @@ def get_user_accessible_calendars(user):
     )
     
     # Combine the queries and apply distinct to remove duplicates
-    return (org_calendars | direct_calendars | project_calendars).distinct()
\ No newline at end of file
+    return (org_calendars | direct_calendars | project_calendars).distinct()
+
+
+def parse_range_param(value):
+    """
+    Parse a start/end query parameter given as an ISO date or datetime.
+    Returns an aware datetime, None if the value is empty, and raises
+    ValueError if it can't be parsed.
+    """
+    if not value:
+        return None
+    
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(day, time.min)
+    
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    
+    return parsed
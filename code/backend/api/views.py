@@ -1,39 +1,74 @@
+import csv
+from datetime import timedelta
+
 from django.utils import timezone
 from django.db.models import Q, F
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from django.contrib.auth import get_user_model
+from django.db import OperationalError, transaction
 
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
 from rest_framework import status
 
 from django_filters.rest_framework import DjangoFilterBackend
 
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
 
 from .models import (
     Organisation, Role, UserOrganisation, Calendar, Event, Project, Chat,
     ChatUser, Message, Song, Timetable, Setlist, History, Status,
-    Task, Recording, External, ChatAccessView, OrganisationInvitation, BugReport
+    Task, Recording, External, ChatAccessView, OrganisationInvitation, BugReport,
+    PersonalAccessToken, SongSequence
 )
 
 from .serializers import (
     UserSerializer, UserDetailSerializer, OrganisationSerializer, RoleSerializer,
     UserOrganisationSerializer, CalendarSerializer, EventSerializer, EventDetailSerializer,
-    ProjectSerializer, ProjectDetailSerializer, ChatSerializer, ChatUserSerializer,
+    ProjectSerializer, ProjectDetailSerializer, ProjectStatsSerializer, ChatSerializer, ChatUserSerializer,
     MessageSerializer, SongSerializer, TimetableSerializer, SetlistSerializer,
     HistorySerializer, StatusSerializer, TaskSerializer, RecordingSerializer,
-    ExternalSerializer, ChatAccessSerializer, OrganisationInvitationSerializer, InviteCodeSerializer, BugReportSerializer
+    ExternalSerializer, ChatAccessSerializer, OrganisationInvitationSerializer, InviteCodeSerializer, BugReportSerializer,
+    PersonalAccessTokenSerializer, BulkInvitationSerializer, MoveSerializer
 )
 
-from .permissions import CanAccessCalendar, CanAccessChat, HasSongPermission, IsMessageOwnerOrReadOnly, IsProjectMember, IsPartOfOrganisationAndStaff, HasProjectAccess
-from .utils import get_user_accessible_calendars, get_user_accessible_chats, user_has_chat_access, get_user_project_events, get_user_accessible_calendars, get_user_project_queryset, check_project_access
+from .authentication import get_cached_user
+from .memberships import add_membership_claims, get_memberships, has_role, is_member
+from .invite_codes import invitation_token_allocator
+from .invitations import with_expiry
+from .permissions import CanAccessCalendar, CanAccessChat, HasSongPermission, IsMessageOwnerOrReadOnly, IsProjectMember, IsPartOfOrganisationAndStaff, HasProjectAccess, SONG_MANAGER_ROLE_IDS
+from .utils import get_user_accessible_calendars, get_user_accessible_chats, user_has_chat_access, get_user_project_events, get_user_accessible_calendars, get_user_project_queryset, check_project_access, parse_range_param, get_user_accessible_projects
+from .conflicts import find_event_conflicts, find_organisation_conflicts
+from .calendar_window import build_calendar_window, calendar_view_key, invalidate_calendar_views, CALENDAR_VIEW_COLUMNS
+from .cache_utils import versioned_key
+from .ical_import import import_ical
+from .people_search import AUTOCOMPLETE_DEFAULT_LIMIT, search_people
+from .bulk import BulkModelMixin
+from .ical_feeds import invalidate_event_feeds_bulk, invalidate_feeds
+from .positions import append_positions, move_item
+from .projects import create_projects, project_scope
+from .project_summary import build_project_summary, with_task_stats
+from .provisioning import PROVISION_API_MAX, provision_users
+from .task_graph import build_task_graph
+from .task_bulk import TASK_BULK_MAX, apply_task_changes
+from .workload import WORKLOAD_DEFAULT_WEEKS, WORKLOAD_MAX_WEEKS, build_workload, week_start
+from .board import BOARD_DEFAULT_CARDS, BOARD_MAX_CARDS, build_task_board
+from .song_io import detect_file_type, iter_song_rows, import_songs, stream_songs_csv, stream_songs_json
 
 User = get_user_model()
 
+CALENDAR_VIEW_MAX_DAYS = 366
+CALENDAR_VIEW_CACHE_TIMEOUT = 300  # seconds
+PROJECT_BULK_MAX = 500
+PROJECT_CACHE_TIMEOUT = 3600  # seconds, entries are also invalidated by version
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_user(request):
@@ -55,6 +90,60 @@ class UserViewSet(viewsets.ModelViewSet):
             return UserDetailSerializer
         return UserSerializer
 
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=[IsAdminUser])
+    def bulk_register(self, request):
+        """
+        Staff only: register up to PROVISION_API_MAX users at once, optionally
+        adding them to an organisation. Accepts a list of users or
+        {"users": [...], "organisation": id, "role": id}. Passwords are hashed
+        in the request; use `manage.py provision_users` for larger imports.
+        """
+        payload = request.data
+        if isinstance(payload, list):
+            payload = {'users': payload}
+        
+        rows = payload.get('users')
+        if not isinstance(rows, list) or not rows or len(rows) > PROVISION_API_MAX:
+            return Response(
+                {"detail": f"Provide a list of 1 to {PROVISION_API_MAX} users."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = provision_users(
+            rows,
+            organisation_id=payload.get('organisation'),
+            role_id=payload.get('role')
+        )
+        
+        return Response(
+            result,
+            status=status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=False, methods=['get'], url_path='autocomplete')
+    def autocomplete(self, request):
+        """
+        Ranked username/name lookup among the people the user can see.
+        ?q=<text>&limit=<n>&organisation=<id>
+        """
+        try:
+            limit = int(request.query_params.get('limit', AUTOCOMPLETE_DEFAULT_LIMIT))
+            organisation_id = request.query_params.get('organisation')
+            organisation_id = int(organisation_id) if organisation_id else None
+        except ValueError:
+            return Response(
+                {"detail": "limit and organisation must be integers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            results = search_people(request, request.query_params.get('q', ''), limit, organisation_id)
+        except OperationalError:
+            # Hit the statement timeout; the next keystroke will try again
+            return Response({'results': [], 'timed_out': True})
+
+        return Response({'results': results})
+
 class OrganisationViewSet(viewsets.ModelViewSet):
     queryset = Organisation.objects.all()
     serializer_class = OrganisationSerializer
@@ -107,7 +196,7 @@ class CalendarViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return get_user_accessible_calendars(self.request.user).order_by('id')
+        return get_user_accessible_calendars(self.request.user).select_related('organisation').order_by('id')
     
     def create(self, request, *args, **kwargs):
         organisation_id = request.data.get('organisation')
@@ -136,6 +225,32 @@ class CalendarViewSet(viewsets.ModelViewSet):
         
         return super().create(request, *args, **kwargs)
 
+    @action(detail=True, methods=['post'], url_path='import')
+    def import_ical(self, request, pk=None):
+        """Bulk import the events of an uploaded .ics file into this calendar"""
+        # get_object() resolves calendar access once for the whole file
+        calendar = self.get_object()
+        
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {"detail": "Upload the .ics file in the 'file' field."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            stats = import_ical(calendar, upload)
+        except ValueError as e:
+            return Response(
+                {"detail": f"Invalid iCalendar file: {e}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            'calendar_id': calendar.id,
+            **stats
+        })
+
 class EventViewSet(viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
@@ -151,6 +266,25 @@ class EventViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Event.objects.filter(calendar__in=get_user_accessible_calendars(self.request.user))
 
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.conflicts = find_event_conflicts(serializer.instance)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.conflicts = find_event_conflicts(serializer.instance)
+
+    def create(self, request, *args, **kwargs):
+        # Report double bookings alongside the saved event
+        response = super().create(request, *args, **kwargs)
+        response.data['conflicts'] = self.conflicts
+        return response
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response.data['conflicts'] = self.conflicts
+        return response
+
 class ProjectViewSet(viewsets.ModelViewSet):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
@@ -161,16 +295,19 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ProjectDetailSerializer
+        if self.with_stats():
+            return ProjectStatsSerializer
         return ProjectSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        user_orgs = UserOrganisation.objects.filter(user=user).values_list('organisation_id', flat=True)
-        
-        org_projects = Project.objects.filter(organisation_id__in=user_orgs)
-        direct_projects = Project.objects.filter(external__user=user)
-        
-        return (org_projects | direct_projects).distinct()
+        queryset = get_user_accessible_projects(self.request.user)
+        if self.with_stats():
+            queryset = with_task_stats(queryset)
+        return queryset
+
+    def with_stats(self):
+        # ?with_stats=1 on the list adds task counts, durations and the next deadline
+        return self.action == 'list' and self.request.query_params.get('with_stats', '').lower() in ('true', '1')
     
     def create(self, request, *args, **kwargs):
         event_id = request.data.get('event')
@@ -190,6 +327,90 @@ class ProjectViewSet(viewsets.ModelViewSet):
         
         return super().create(request, *args, **kwargs)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        """
+        Create many projects at once, each with its chat. Accepts a list of
+        projects or {"projects": [...]}; all rows must be valid.
+        """
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('projects')
+        if not isinstance(rows, list) or not rows or len(rows) > PROJECT_BULK_MAX:
+            return Response(
+                {"detail": f"Provide a list of 1 to {PROJECT_BULK_MAX} projects."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = ProjectSerializer(data=rows, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+
+        if not request.user.is_staff:
+            # One membership lookup for all rows, including the events' organisations
+            organisation_ids = {data['organisation'].id for data in serializer.validated_data}
+            event_ids = {data['event'].id for data in serializer.validated_data if data.get('event')}
+            organisation_ids.update(Event.objects.filter(id__in=event_ids).values_list(
+                'calendar__organisation_id', flat=True
+            ))
+            if not all(is_member(request, organisation_id) for organisation_id in organisation_ids):
+                return Response(
+                    {"detail": "You can only create projects in organizations you belong to."},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+
+        projects = create_projects([Project(**data) for data in serializer.validated_data])
+        return Response(
+            ProjectSerializer(projects, many=True, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=True, methods=['get'], url_path='task-graph')
+    def task_graph(self, request, pk=None):
+        """
+        Dependency graph of the project's tasks: topological order, critical
+        path by duration and ready/blocked tasks. Cached until a task changes.
+        """
+        project = self.get_object()
+        cache_key = versioned_key('task-graph', project_scope(project.id), project.id)
+        graph = cache.get(cache_key)
+        if graph is None:
+            graph = build_task_graph(project.id)
+            cache.set(cache_key, graph, PROJECT_CACHE_TIMEOUT)
+        return Response(graph)
+
+    @action(detail=True, methods=['get'])
+    def board(self, request, pk=None):
+        """
+        Everything a kanban board needs in one request: per-status counts
+        and durations plus the first ?cards=N slim cards of each column.
+        """
+        project = self.get_object()
+        try:
+            cards = int(request.query_params.get('cards', BOARD_DEFAULT_CARDS))
+        except ValueError:
+            return Response(
+                {"detail": "cards must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        cards = max(0, min(cards, BOARD_MAX_CARDS))
+
+        cache_key = versioned_key('task-board', project_scope(project.id), project.id, cards)
+        board = cache.get(cache_key)
+        if board is None:
+            board = build_task_board(project.id, cards)
+            cache.set(cache_key, board, PROJECT_CACHE_TIMEOUT)
+        return Response(board)
+
+    @action(detail=True, methods=['get'])
+    def summary(self, request, pk=None):
+        """
+        Compact project overview for dashboards: task counts by status, the
+        next deadline, member count and last chat activity, without the
+        nested tasks of the detail view. Not cached since it follows the chat.
+        """
+        project = self.get_object()
+        return Response(build_project_summary(project.id))
+
 class ChatViewSet(viewsets.ModelViewSet):
     queryset = Chat.objects.all()
     serializer_class = ChatSerializer
@@ -236,11 +457,24 @@ class ChatViewSet(viewsets.ModelViewSet):
 
         return super().create(request, *args, **kwargs)
 
-class ChatUserViewSet(viewsets.ModelViewSet):
+def accessible_event_ids(request, event_ids):
+    """The subset of `event_ids` in the user's organisations or projects"""
+    return Event.objects.filter(id__in=event_ids).filter(
+        Q(calendar__organisation_id__in=list(get_memberships(request))) |
+        Q(project__external__user=request.user)
+    ).values_list('id', flat=True)
+
+class ChatUserViewSet(BulkModelMixin, viewsets.ModelViewSet):
     queryset = ChatUser.objects.all()
     serializer_class = ChatUserSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['user', 'chat', 'view', 'write']
+    bulk_parent_field = 'chat'
+
+    def get_bulk_allowed_parents(self, parent_ids):
+        return get_user_accessible_chats(self.request.user).filter(
+            id__in=parent_ids
+        ).values_list('id', flat=True)
 
 class MessageViewSet(viewsets.ModelViewSet):
     queryset = Message.objects.all()
@@ -259,13 +493,15 @@ class MessageViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         serializer.save(edited=timezone.now())
 
-class SongViewSet(viewsets.ModelViewSet):
+class SongViewSet(BulkModelMixin, viewsets.ModelViewSet):
     queryset = Song.objects.all()
     serializer_class = SongSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['nr']
     search_fields = ['name', 'description']
     permission_classes = [IsAuthenticated, HasSongPermission]
+    bulk_parent_field = 'organisation'
+    bulk_permission_classes = [IsAuthenticated, HasSongPermission]
     
     def get_queryset(self):
         user = self.request.user
@@ -279,13 +515,28 @@ class SongViewSet(viewsets.ModelViewSet):
             organisation_id__in=user_orgs
         ).distinct()
 
-class TimetableViewSet(viewsets.ModelViewSet):
+    def get_bulk_allowed_parents(self, parent_ids):
+        return [org_id for org_id in parent_ids if has_role(self.request, SONG_MANAGER_ROLE_IDS, org_id)]
+
+    def bulk_prepare(self, songs):
+        # Reserve one block of numbers per organisation instead of one per song
+        by_organisation = {}
+        for song in songs:
+            if not song.nr:
+                by_organisation.setdefault(song.organisation_id, []).append(song)
+        for organisation_id, group in by_organisation.items():
+            first_nr = SongSequence.reserve(organisation_id, len(group))
+            for offset, song in enumerate(group):
+                song.nr = first_nr + offset
+
+class TimetableViewSet(BulkModelMixin, viewsets.ModelViewSet):
     queryset = Timetable.objects.all().order_by('id')
     serializer_class = TimetableSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['event']
     search_fields = ['name']
     permission_classes = [IsAuthenticated]
+    bulk_parent_field = 'event'
     
     def get_queryset(self):
         user = self.request.user
@@ -303,6 +554,13 @@ class TimetableViewSet(viewsets.ModelViewSet):
         accessible_events = (project_events | org_events).distinct()
         
         return Timetable.objects.filter(event__in=accessible_events).order_by('id')
+
+    def get_bulk_allowed_parents(self, parent_ids):
+        return accessible_event_ids(self.request, parent_ids)
+
+    def bulk_changed(self, entries, previous=()):
+        event_ids = {entry.event_id for entry in list(entries) + list(previous)}
+        transaction.on_commit(lambda: invalidate_event_feeds_bulk(event_ids))
     
     def check_permissions(self, request):
         if self.action in ['list', 'retrieve'] and request.user.is_authenticated:
@@ -310,19 +568,20 @@ class TimetableViewSet(viewsets.ModelViewSet):
         
         return super().check_permissions(request)
 
-class SetlistViewSet(viewsets.ModelViewSet):
+class SetlistViewSet(BulkModelMixin, viewsets.ModelViewSet):
     queryset = Setlist.objects.all()
     serializer_class = SetlistSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['event', 'song']
     search_fields = ['name']
     permission_classes = [IsAuthenticated, IsProjectMember]
+    bulk_parent_field = 'event'
 
     def get_queryset(self):
         user = self.request.user
         
         if user.is_staff:
-            return Setlist.objects.all()
+            return Setlist.objects.order_by('event_id', 'position', 'id')
             
         user_projects = Project.objects.filter(external__user=user)
         project_events = Event.objects.filter(project__in=user_projects)
@@ -333,7 +592,37 @@ class SetlistViewSet(viewsets.ModelViewSet):
         
         accessible_events = (project_events | org_events).distinct()
         
-        return Setlist.objects.filter(event__in=accessible_events)
+        return Setlist.objects.filter(event__in=accessible_events).order_by('event_id', 'position', 'id')
+
+    def get_bulk_allowed_parents(self, parent_ids):
+        return accessible_event_ids(self.request, parent_ids)
+
+    def bulk_prepare(self, entries):
+        append_positions(Setlist, 'event', entries)
+
+    def bulk_changed(self, entries, previous=()):
+        event_ids = {entry.event_id for entry in list(entries) + list(previous)}
+        transaction.on_commit(lambda: invalidate_event_feeds_bulk(event_ids))
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """
+        Move a setlist entry between two entries of its event
+        ({"after": id, "before": id}, either may be left out).
+        """
+        entry = self.get_object()
+        serializer = MoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            move_item(
+                entry, 'event',
+                serializer.validated_data.get('after'), serializer.validated_data.get('before')
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'id': entry.id, 'position': entry.position})
 
 class HistoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = History.objects.all()
@@ -369,20 +658,67 @@ class TaskViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Task.objects.all()
+            return Task.objects.order_by('project_id', 'position', 'id')
             
         # Return tasks that the user can access
         return Task.objects.filter(
             Q(user=user) |  # User's own tasks
             Q(project__external__user=user) |  # Tasks in projects user is member of
             Q(project__organisation__userorganisation__user=user)  # Tasks in org projects
-        ).distinct()
+        ).distinct().order_by('project_id', 'position', 'id')
 
     def perform_create(self, serializer):
         # The permission check is already done in has_permission
         # Just save with the current user
         serializer.save(user=self.request.user)
 
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """
+        Move a task between two tasks of its project ({"after": id, "before": id},
+        either may be left out), optionally into another status column.
+        Only the moved task is written.
+        """
+        task = self.get_object()
+        serializer = MoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        update_fields = []
+        if 'status' in request.data:
+            try:
+                task.status = Status.objects.get(id=request.data['status'])
+            except (Status.DoesNotExist, ValueError, TypeError):
+                return Response({"status": ["Invalid status."]}, status=status.HTTP_400_BAD_REQUEST)
+            update_fields.append('status')
+
+        try:
+            move_item(
+                task, 'project',
+                serializer.validated_data.get('after'), serializer.validated_data.get('before'),
+                update_fields=update_fields + ['updated']
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'id': task.id, 'position': task.position, 'status': task.status_id})
+
+    @action(detail=False, methods=['patch'], url_path='bulk')
+    def bulk_update(self, request):
+        """
+        Change status, position, user and/or deadline of many tasks at once.
+        Accepts a list of {"id": ..., <fields>} or {"tasks": [...]}.
+        """
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('tasks')
+        if not isinstance(rows, list) or not rows or len(rows) > TASK_BULK_MAX:
+            return Response(
+                {"detail": f"Provide a list of 1 to {TASK_BULK_MAX} task changes."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(apply_task_changes(request, rows))
+
 class RecordingViewSet(viewsets.ModelViewSet):
     queryset = Recording.objects.all()
     serializer_class = RecordingSerializer
@@ -393,12 +729,14 @@ class RecordingViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return get_user_project_queryset(self.request.user, self.queryset, project_field='project')
 
-class ExternalViewSet(viewsets.ModelViewSet):
+class ExternalViewSet(BulkModelMixin, viewsets.ModelViewSet):
     queryset = External.objects.all()
     serializer_class = ExternalSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['user', 'project', 'role']
     permission_classes = [IsAuthenticated]
+    # Allowed projects are those of the user's organisations, see BulkModelMixin
+    bulk_parent_field = 'project'
     
     def get_queryset(self):
         user = self.request.user
@@ -410,6 +748,11 @@ class ExternalViewSet(viewsets.ModelViewSet):
         
         return External.objects.filter(project__in=accessible_projects)
 
+    def bulk_changed(self, externals, previous=()):
+        user_ids = {external.user_id for external in list(externals) + list(previous)}
+        transaction.on_commit(lambda: invalidate_calendar_views(user_ids=user_ids))
+        transaction.on_commit(lambda: invalidate_feeds(user_ids=user_ids))
+
 class ChatAccessViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = ChatAccessView.objects.all()
     serializer_class = ChatAccessSerializer
@@ -433,12 +776,30 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['email'] = user.email
         token['first_name'] = user.first_name
         token['last_name'] = user.last_name
+        add_membership_claims(token, user)
         
         return token
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+
+        # The refresh token carries the memberships from login, so give the
+        # new access token current ones
+        access = AccessToken(data['access'])
+        user = get_cached_user(access[jwt_settings.USER_ID_CLAIM])
+        if user is not None:
+            add_membership_claims(access, user)
+            data['access'] = str(access)
+
+        return data
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def upgrade_to_premium(request):
@@ -603,7 +964,11 @@ def get_externals_by_organisation(request, org_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_all_users_by_organisation(request, org_id):
+def get_organisation_conflicts(request, org_id):
+    """
+    Scan an organisation's events for double bookings in a date range.
+    Defaults to the next 30 days when no range is given.
+    """
     try:
         organisation = Organisation.objects.get(id=org_id)
     except Organisation.DoesNotExist:
@@ -614,14 +979,230 @@ def get_all_users_by_organisation(request, org_id):
     
     user = request.user
     if not user.is_staff:
-        # Check if user is admin in this org (assuming role_id=1 is admin)
-        is_admin = UserOrganisation.objects.filter(
+        has_org_access = UserOrganisation.objects.filter(
             user=user, 
+            organisation=organisation
+        ).exists()
+        
+        if not has_org_access:
+            return Response(
+                {"detail": "You don't have access to this organisation."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+    
+    try:
+        start = parse_range_param(request.query_params.get('start')) or timezone.now()
+        end = parse_range_param(request.query_params.get('end')) or start + timedelta(days=30)
+    except ValueError:
+        return Response(
+            {"detail": "start and end must be ISO 8601 dates or datetimes."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if end <= start:
+        return Response(
+            {"detail": "end must be after start."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    conflicts = find_organisation_conflicts(organisation.id, start, end)
+    
+    return Response({
+        'organisation_id': organisation.id,
+        'start': start,
+        'end': end,
+        'conflicts': conflicts,
+        'total_conflicts': len(conflicts)
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_organisation_workload(request, org_id):
+    """
+    Minutes of open tasks per member and week, by deadline.
+    ?from= and ?to= are snapped to whole weeks; defaults to the next 8 weeks.
+    """
+    try:
+        organisation = Organisation.objects.get(id=org_id)
+    except Organisation.DoesNotExist:
+        return Response(
+            {"detail": "Organisation not found."},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    if not request.user.is_staff and not is_member(request, organisation.id):
+        return Response(
+            {"detail": "You don't have access to this organisation."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    try:
+        start = week_start(parse_range_param(request.query_params.get('from')) or timezone.now())
+        end = parse_range_param(request.query_params.get('to'))
+    except ValueError:
+        return Response(
+            {"detail": "from and to must be ISO 8601 dates or datetimes."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    weeks = WORKLOAD_DEFAULT_WEEKS if end is None else -(-(end - start).days // 7)
+    if weeks < 1 or weeks > WORKLOAD_MAX_WEEKS:
+        return Response(
+            {"detail": f"to must be after from and the range can span at most {WORKLOAD_MAX_WEEKS} weeks."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response(build_workload(organisation.id, start, weeks))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def calendar_view(request):
+    """
+    One flat, time-ordered stream of events, task deadlines and project
+    deadlines for a month/week window. Defaults to the next 31 days.
+    """
+    try:
+        start = parse_range_param(request.query_params.get('start'))
+        if start is None:
+            start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        end = parse_range_param(request.query_params.get('end')) or start + timedelta(days=31)
+    except ValueError:
+        return Response(
+            {"detail": "start and end must be ISO 8601 dates or datetimes."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if end <= start:
+        return Response(
+            {"detail": "end must be after start."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if end - start > timedelta(days=CALENDAR_VIEW_MAX_DAYS):
+        return Response(
+            {"detail": f"The window can span at most {CALENDAR_VIEW_MAX_DAYS} days."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Cached per user and window, invalidated by changes in the organisations they see
+    cache_key = calendar_view_key(request, start, end)
+    rows = cache.get(cache_key)
+    if rows is None:
+        rows = build_calendar_window(request.user, start, end)
+        cache.set(cache_key, rows, CALENDAR_VIEW_CACHE_TIMEOUT)
+    
+    return Response({
+        'start': start,
+        'end': end,
+        'columns': CALENDAR_VIEW_COLUMNS,
+        'rows': rows,
+        'count': len(rows)
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_organisation_songs(request, org_id):
+    """
+    Bulk import songs from an uploaded CSV, JSON or JSON Lines file
+    with 'name' and optional 'description' columns.
+    """
+    try:
+        organisation = Organisation.objects.get(id=org_id)
+    except Organisation.DoesNotExist:
+        return Response(
+            {"detail": "Organisation not found."},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    user = request.user
+    if not user.is_staff:
+        is_song_manager = UserOrganisation.objects.filter(
+            user=user,
             organisation=organisation,
-            role_id=1
+            role_id__in=SONG_MANAGER_ROLE_IDS
         ).exists()
         
-        if not is_admin:
+        if not is_song_manager:
+            return Response(
+                {"detail": "You don't have permission to manage songs in this organisation."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+    
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response(
+            {"detail": "Upload the song list in the 'file' field."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    file_type = detect_file_type(upload, request.data.get('file_type'))
+    try:
+        result = import_songs(organisation, iter_song_rows(upload, file_type))
+    except (ValueError, csv.Error) as e:
+        return Response(
+            {"detail": f"Could not read the song list: {e}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({
+        'organisation_id': organisation.id,
+        **result
+    }, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_organisation_songs(request, org_id):
+    """Stream an organisation's song library as CSV (default) or JSON"""
+    try:
+        organisation = Organisation.objects.get(id=org_id)
+    except Organisation.DoesNotExist:
+        return Response(
+            {"detail": "Organisation not found."},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    user = request.user
+    if not user.is_staff:
+        has_org_access = UserOrganisation.objects.filter(
+            user=user, 
+            organisation=organisation
+        ).exists()
+        
+        if not has_org_access:
+            return Response(
+                {"detail": "You don't have access to this organisation."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+    
+    file_type = request.query_params.get('file_type', 'csv')
+    if file_type == 'json':
+        response = StreamingHttpResponse(stream_songs_json(organisation), content_type='application/json')
+    elif file_type == 'csv':
+        response = StreamingHttpResponse(stream_songs_csv(organisation), content_type='text/csv')
+    else:
+        return Response(
+            {"detail": "file_type must be 'csv' or 'json'."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    response['Content-Disposition'] = f'attachment; filename="songs-{organisation.id}.{file_type}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_all_users_by_organisation(request, org_id):
+    try:
+        organisation = Organisation.objects.get(id=org_id)
+    except Organisation.DoesNotExist:
+        return Response(
+            {"detail": "Organisation not found."},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    user = request.user
+    if not user.is_staff:
+        # Check if user is admin in this org (assuming role_id=1 is admin)
+        if not has_role(request, [1], organisation.id):
             return Response(
                 {"detail": "Only admins can view all users in this organisation."},
                 status=status.HTTP_403_FORBIDDEN
@@ -707,40 +1288,78 @@ class OrganisationInvitationViewSet(viewsets.ModelViewSet):
     serializer_class = OrganisationInvitationSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['organisation', 'invited_user', 'accepted', 'declined']
+    filterset_fields = ['organisation', 'invite_code', 'accepted', 'declined']
     
     def get_queryset(self):
         user = self.request.user
+        queryset = with_expiry(OrganisationInvitation.objects.all())
+
+        # ?expired=true/false, filtered in SQL on the indexed expires column
+        expired = self.request.query_params.get('expired')
+        if expired is not None:
+            queryset = queryset.filter(expired=expired.lower() in ('true', '1'))
+
         if user.is_staff:
-            return OrganisationInvitation.objects.all()
+            return queryset
         
         # Users can see invitations for organizations they admin
-        admin_orgs = UserOrganisation.objects.filter(
-            user=user, 
-            role_id=1  # Admin role
-        ).values_list('organisation_id', flat=True)
+        admin_orgs = [
+            org_id for org_id, (role_id, _) in get_memberships(self.request).items()
+            if role_id == 1  # Admin role
+        ]
         
         # Also include invitations sent to them
-        return OrganisationInvitation.objects.filter(
-            Q(organisation_id__in=admin_orgs) | Q(invited_user=user)
+        return queryset.filter(
+            Q(organisation_id__in=admin_orgs) | Q(invite_code=user.invite_code)
         )
     
+    def check_can_invite(self, organisation):
+        if not self.request.user.is_staff and not has_role(self.request, [1], organisation.id):
+            raise PermissionDenied("Only admins can invite users to this organization.")
+    
     def perform_create(self, serializer):
         # Check if user can invite to this organization
-        org = serializer.validated_data['organisation']
-        user = self.request.user
-        
-        if not user.is_staff:
-            is_admin = UserOrganisation.objects.filter(
-                user=user,
-                organisation=org,
-                role_id=1  # Admin role
-            ).exists()
-            
-            if not is_admin:
-                raise PermissionDenied("Only admins can invite users to this organization.")
-        
-        serializer.save(invited_by=user)
+        self.check_can_invite(serializer.validated_data['organisation'])
+        serializer.save(invited_by=self.request.user)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_invite(self, request):
+        """
+        Invite many users to one organisation by their invite codes.
+        Unknown codes and users that were already invited are skipped.
+        """
+        serializer = BulkInvitationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        organisation = serializer.validated_data['organisation']
+        role = serializer.validated_data['role']
+        self.check_can_invite(organisation)
+
+        codes = list(dict.fromkeys(serializer.validated_data['invite_codes']))
+        known = set(User.objects.filter(invite_code__in=codes).values_list('invite_code', flat=True))
+        invited = set(OrganisationInvitation.objects.filter(
+            organisation=organisation, invite_code__in=codes
+        ).values_list('invite_code', flat=True))
+        to_invite = [code for code in codes if code in known and code not in invited]
+
+        expires = timezone.now() + timedelta(days=7)
+        tokens = invitation_token_allocator.allocate(len(to_invite)) if to_invite else []
+        invitations = OrganisationInvitation.objects.bulk_create([
+            OrganisationInvitation(
+                organisation=organisation, invited_by=request.user, invite_code=code,
+                role=role, token=token, expires=expires
+            )
+            for code, token in zip(to_invite, tokens)
+        ])
+        for invitation in invitations:
+            invitation.expired = False
+
+        return Response({
+            'created': OrganisationInvitationSerializer(
+                invitations, many=True, context={'request': request}
+            ).data,
+            'unknown_codes': [code for code in codes if code not in known],
+            'already_invited': [code for code in codes if code in invited],
+        }, status=status.HTTP_201_CREATED)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -748,7 +1367,7 @@ def get_invitation_details(request, token):
     """Public endpoint to view invitation details"""
     try:
         invitation = OrganisationInvitation.objects.select_related(
-            'organisation', 'role', 'invited_by', 'invited_user'
+            'organisation', 'role', 'invited_by'
         ).get(token=token)
     except OrganisationInvitation.DoesNotExist:
         return Response(
@@ -764,11 +1383,15 @@ def get_invitation_details(request, token):
 def my_invitations(request):
     """Get pending invitations for current user"""
     user = request.user
-    pending_invitations = OrganisationInvitation.objects.filter(
+    # Matches the partial index api_invitation_pending_idx
+    pending_invitations = list(OrganisationInvitation.objects.filter(
         invite_code=user.invite_code,  # ✅ Use invite_code instead
         accepted=False,
-        declined=False
-    ).select_related('organisation', 'role', 'invited_by')
+        declined=False,
+        expires__gt=timezone.now()
+    ).select_related('organisation', 'role', 'invited_by'))
+    for invitation in pending_invitations:
+        invitation.expired = False
         
     serializer = OrganisationInvitationSerializer(
         pending_invitations, 
@@ -778,7 +1401,7 @@ def my_invitations(request):
     
     return Response({
         'pending_invitations': serializer.data,
-        'count': pending_invitations.count()
+        'count': len(pending_invitations)
     })
 
 @api_view(['GET'])
@@ -907,3 +1530,35 @@ class BugReportViewSet(viewsets.ModelViewSet):
             serializer.save(user=self.request.user)
         else:
             serializer.save()
+
+class PersonalAccessTokenViewSet(viewsets.ModelViewSet):
+    """
+    Manage the current user's personal access tokens. The key is only
+    returned when the token is created; deleting a token revokes it.
+    """
+    queryset = PersonalAccessToken.objects.all()
+    serializer_class = PersonalAccessTokenSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'delete']
+
+    def get_queryset(self):
+        return PersonalAccessToken.objects.filter(user=self.request.user)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # A token must not be able to mint or revoke tokens
+        if isinstance(request.auth, PersonalAccessToken):
+            raise PermissionDenied("Personal access tokens can't be managed with a personal access token.")
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token, key = PersonalAccessToken.create_token(request.user, **serializer.validated_data)
+
+        data = self.get_serializer(token).data
+        data['token'] = key
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    def perform_destroy(self, instance):
+        instance.revoked = True
+        instance.save(update_fields=['revoked'])
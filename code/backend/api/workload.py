@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .models import DONE_STATUS_ID, Task, User, UserOrganisation
+
+WORKLOAD_DEFAULT_WEEKS = 8
+WORKLOAD_MAX_WEEKS = 53
+
+
+def week_start(moment):
+    """Monday 00:00 (current timezone) of the week `moment` falls in"""
+    local = timezone.localtime(moment)
+    return (local - timedelta(days=local.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def build_workload(organisation_id, start, weeks):
+    """
+    Minutes of open tasks per member and week for an organisation's projects,
+    by task deadline.
+
+    The database groups the tasks by (user, week) and sums their durations,
+    so only one row per non-empty cell comes back however many tasks there
+    are. The cells are written into a flat, row-major users x weeks matrix.
+    """
+    end = start + timedelta(weeks=weeks)
+
+    cells = Task.objects.filter(
+        project__organisation_id=organisation_id,
+        deadline__gte=start,
+        deadline__lt=end,
+    ).exclude(status_id=DONE_STATUS_ID).annotate(
+        week=TruncWeek('deadline')
+    ).values_list('user_id', 'week').annotate(minutes=Sum('duration')).order_by()
+    cells = list(cells)
+
+    # Every member gets a row, plus anyone else with tasks in the range
+    user_ids = set(UserOrganisation.objects.filter(
+        organisation_id=organisation_id
+    ).values_list('user_id', flat=True))
+    user_ids.update(user_id for user_id, _, _ in cells)
+    users = list(User.objects.filter(id__in=user_ids).order_by('username').values(
+        'id', 'username', 'first_name', 'last_name'
+    ))
+    rows = {user['id']: index for index, user in enumerate(users)}
+
+    minutes = [0] * (len(users) * weeks)
+    first_day = start.date()
+    for user_id, week, total in cells:
+        column = (timezone.localtime(week).date() - first_day).days // 7
+        minutes[rows[user_id] * weeks + column] += total or 0
+
+    return {
+        'organisation': organisation_id,
+        'from': start,
+        'to': end,
+        'weeks': [(start + timedelta(weeks=index)).date() for index in range(weeks)],
+        'users': users,
+        # Row-major: minutes[user_index * len(weeks) + week_index]
+        'minutes': minutes,
+        'user_totals': [sum(minutes[row * weeks:(row + 1) * weeks]) for row in range(len(users))],
+        'week_totals': [sum(minutes[column::weeks]) for column in range(weeks)],
+    }
@@ -102,6 +102,15 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'mediafiles')
 
+# Drop <calendar_id>.ics files here to have `manage.py import_ical --watch` re-import them
+ICAL_IMPORT_DIR = env('ICAL_IMPORT_DIR', default=os.path.join(BASE_DIR, 'ical_import'))
+
+# Pre-rendered iCal feeds. nginx serves them from ICAL_FEED_ACCEL_PREFIX (an internal
+# location) once Django has checked the token and answered with X-Accel-Redirect
+ICAL_FEED_ROOT = env('ICAL_FEED_ROOT', default=os.path.join(BASE_DIR, 'icalfeeds'))
+ICAL_FEED_ACCEL_PREFIX = '/protected-feeds/'
+ICAL_FEED_X_ACCEL = env.bool('ICAL_FEED_X_ACCEL', default=True)
+
 # Channels configuration
 CHANNEL_LAYERS = {
     'default': {
@@ -112,6 +121,15 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache configuration (shares the Redis instance used by Channels)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f"redis://{env('REDIS_HOST')}:{env.int('REDIS_PORT')}/1",
+        'TIMEOUT': 300,
+    }
+}
+
 # CORS settings - important for Flutter
 # Update this line in settings.py
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '[::1]', 'backend', '*']
@@ -124,8 +142,9 @@ CORS_ALLOW_CREDENTIALS = True
 # Update REST_FRAMEWORK settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
+        'api.authentication.PersonalAccessTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -165,6 +184,16 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Embed the user's organisation memberships in access tokens so permission
+# checks can skip the database (see api/memberships.py)
+JWT_MEMBERSHIP_CLAIMS = True
+JWT_MEMBERSHIP_CLAIM_MAX_ORGS = 50
+
+# How long before a task or project deadline `manage.py run_reminders`
+# posts a reminder to the project chat, and as which user (see api/reminders.py)
+DEADLINE_REMINDER_LEADS = [timedelta(days=1), timedelta(hours=1)]
+DEADLINE_REMINDER_SENDER = 'delegator'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 